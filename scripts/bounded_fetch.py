@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Bounded Page Fetching
+Streams GET responses so that non-HTML content is rejected from the
+headers and bodies stop at a byte cap, bounding bandwidth and memory per
+worker. Pages are stored in the shared HTTP cache here, since the caching
+adapter leaves streamed bodies alone: complete pages as ordinary entries,
+prefix reads as partial entries that later prefix reads are answered from
+(revalidated with the stored ETag / Last-Modified once stale).
+"""
+
+import logging
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from http_cache import CachingAdapter, HTTPCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024  # Largest page downloaded in full
+CHUNK_SIZE = 16 * 1024
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+
+class ContentRejected(Exception):
+    """The response is not an HTML page, or is larger than allowed"""
+
+
+class Page:
+    """The parts of a response the pipeline uses, with a bounded body"""
+
+    __slots__ = ('url', 'status_code', 'headers', 'content', 'encoding', 'truncated', 'from_cache')
+
+    def __init__(self, response: requests.Response, content: bytes, truncated: bool):
+        self.url = response.url
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.content = content
+        self.encoding = response.encoding
+        self.truncated = truncated  # Only the first prefix_bytes were read
+        self.from_cache = getattr(response, 'from_cache', False)
+
+    @classmethod
+    def from_cache_entry(cls, url: str, entry: Dict) -> 'Page':
+        """A truncated page from a partial HTTP cache entry"""
+        page = cls.__new__(cls)
+        page.url = url
+        page.status_code = entry['status']
+        page.headers = CaseInsensitiveDict(entry['headers'])
+        page.content = entry['body']
+        page.encoding = requests.utils.get_encoding_from_headers(page.headers)
+        page.truncated = True
+        page.from_cache = True
+        return page
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} for {self.url}")
+
+
+def is_html(content_type: str) -> bool:
+    """True for HTML types, and for a missing type (left to the parser)"""
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    return not media_type or media_type in HTML_CONTENT_TYPES
+
+
+def fetch_page(session: requests.Session, url: str, timeout: float = 30,
+               max_bytes: int = DEFAULT_MAX_BYTES, prefix_bytes: Optional[int] = None,
+               screen: Optional[Callable[[Page], bool]] = None, **kwargs) -> Page:
+    """GET an HTML page, reading at most max_bytes of it
+
+    With prefix_bytes, reading stops after that many bytes and the page is
+    returned with truncated=True instead of being downloaded in full.
+    With screen as well, the first prefix_bytes are passed to screen() as a
+    truncated page instead; reading stops there only if it returns True,
+    and otherwise carries on over the same connection. A page shorter than
+    prefix_bytes is screened complete.
+    A prefix read is answered from a partial cache entry at least as long:
+    as is while it is fresh, else after a 304 to a conditional GET. If
+    screen() rejects a cached prefix, the page is fetched normally.
+    Raises ContentRejected for non-HTML responses and for pages over
+    max_bytes (judged from Content-Length when sent, else while reading).
+    """
+    cache = page_cache(session, url) if prefix_bytes else None
+    cached = cache.get(url) if cache else None
+    if cached and not (cached['partial'] and len(cached['body']) >= min(prefix_bytes, max_bytes)):
+        cached = None  # Complete entries are answered by the caching adapter
+    if cached and cache.is_fresh(cached):
+        page = Page.from_cache_entry(url, cached)
+        if screen is None or screen(page):
+            return page
+        cached = None
+
+    request_kwargs = kwargs
+    if cached:
+        validators = {}
+        if cached['etag']:
+            validators['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            validators['If-Modified-Since'] = cached['last_modified']
+        request_kwargs = dict(kwargs, headers={**(kwargs.get('headers') or {}), **validators})
+
+    with session.get(url, timeout=timeout, stream=True, **request_kwargs) as response:
+        page = None
+        if not (cached and response.status_code == 304):
+            page = read_page(response, url, max_bytes, prefix_bytes, screen)
+
+    if page is None:
+        cache.touch(url)
+        page = Page.from_cache_entry(url, cached)
+        if screen is None or screen(page):
+            return page
+        with session.get(url, timeout=timeout, stream=True, **kwargs) as response:
+            page = read_page(response, url, max_bytes, prefix_bytes, screen)
+
+    if not page.from_cache:
+        store_page(session, page, url)
+    return page
+
+
+def read_page(response: requests.Response, url: str, max_bytes: int,
+              prefix_bytes: Optional[int], screen: Optional[Callable[[Page], bool]]) -> Page:
+    """Read a streamed response's body within the limits fetch_page was given"""
+    content_type = response.headers.get('Content-Type', '')
+    if not is_html(content_type):
+        raise ContentRejected(f"{url} is {content_type.split(';', 1)[0]}, not HTML")
+
+    full = not prefix_bytes or screen is not None
+    limit = min(prefix_bytes, max_bytes) if prefix_bytes else max_bytes
+    length = response.headers.get('Content-Length')
+    if full and length and length.isdigit() and int(length) > max_bytes:
+        raise ContentRejected(f"{url} is {int(length)} bytes, over the {max_bytes} byte cap")
+
+    screening = bool(prefix_bytes) and screen is not None
+    chunks = []
+    received = 0
+    truncated = False
+    for chunk in response.iter_content(CHUNK_SIZE):
+        chunks.append(chunk)
+        received += len(chunk)
+        if received > limit:
+            if screening:
+                screening = False
+                if screen(Page(response, b''.join(chunks)[:limit], True)):
+                    truncated = True
+                    break
+                limit = max_bytes
+                if received <= limit:
+                    continue
+            if full:
+                raise ContentRejected(f"{url} exceeded the {max_bytes} byte cap")
+            truncated = True
+            break
+    content = b''.join(chunks)[:limit] if truncated else b''.join(chunks)
+
+    page = Page(response, content, truncated)
+    if screening:
+        screen(page)
+    return page
+
+
+def page_cache(session: requests.Session, url: str) -> Optional[HTTPCache]:
+    """The HTTP cache behind a session's adapter for url, if it has one"""
+    adapter = session.get_adapter(url)
+    return adapter.cache if isinstance(adapter, CachingAdapter) else None
+
+
+def store_page(session: requests.Session, page: Page, url: Optional[str] = None):
+    """Put a page into the session's HTTP cache, if it has one
+
+    Like the caching adapter, a complete page is keyed by its final URL
+    after redirects. A truncated page is stored as a partial entry under
+    the URL it was requested as (url), which is what prefix reads look up.
+    """
+    cache = page_cache(session, page.url)
+    cache_control = page.headers.get('Cache-Control', '').lower()
+    if cache is None or page.status_code != 200 or 'no-store' in cache_control:
+        return
+    if page.truncated:
+        cache.store(url or page.url, page.status_code, page.headers, page.content, partial=True)
+    else:
+        cache.store(page.url, page.status_code, page.headers, page.content)
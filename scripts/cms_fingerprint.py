@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+CMS Fingerprinting
+Identifies a site's CMS from response headers, cookies, the generator meta
+tag, script and stylesheet URLs and the page markup. Rules are loaded from a
+data file and compiled once per process into one matcher per signal, so a
+page is scanned once however many vendors the rule file lists.
+
+Rule file format (JSON), keyed by CMS name:
+  category   'government', 'general' or 'builder'
+  generator  regexes for <meta name="generator">; group 1 is the version
+  headers    header name -> regexes for its value; group 1 is the version
+  cookies    cookie name prefixes
+  scripts    substrings of script src and stylesheet href URLs
+  html       substrings of the page markup
+All matching is case-insensitive.
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cms_fingerprints.json')
+
+# How strongly one kind of signal identifies a CMS on its own; different
+# kinds combine as independent evidence, 1 - prod(1 - weight)
+SIGNAL_WEIGHTS = {'generator': 0.9, 'header': 0.8, 'cookie': 0.7, 'script': 0.6, 'html': 0.4}
+
+# Cookie names in a (possibly comma-joined) Set-Cookie value
+COOKIE_NAME = re.compile(r'(?:^|,)\s*([^=;,\s]+)=')
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """Regex source matching any of words, factored by common prefix
+
+    At each position of the text the regex follows one path down the trie,
+    so its cost depends on the text and the alphabet rather than on the
+    number of words. The longest word is matched where several start at
+    the same position.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if '' in node else body
+
+    return build(trie)
+
+
+class LiteralMatcher:
+    """Finds many lowercase substrings (or line prefixes) in one pass"""
+
+    def __init__(self, needles: Dict[str, List[int]], prefix: bool = False):
+        self.needles = needles  # Needle -> indexes of the rules it belongs to
+        self.pattern = None
+        if needles:
+            source = trie_pattern(needles)
+            self.pattern = re.compile(f"^{source}" if prefix else source, re.MULTILINE)
+
+    def find(self, text: str) -> Iterator[int]:
+        """Rule indexes of the needles found in lowercase text"""
+        if self.pattern is None or not text:
+            return
+        for match in self.pattern.finditer(text):
+            yield from self.needles[match.group()]
+
+
+class PatternMatcher:
+    """Several rules' regexes combined into a single alternation"""
+
+    def __init__(self, patterns: List[Tuple[str, int]]):
+        self.groups: Dict[int, Tuple[int, int]] = {}  # Wrapper group -> (rule, inner groups)
+        parts = []
+        group = 0
+        for pattern, rule in patterns:
+            inner = re.compile(pattern).groups
+            group += 1
+            self.groups[group] = (rule, inner)
+            parts.append(f"({pattern})")
+            group += inner
+        self.pattern = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+
+    def find(self, text: str) -> Iterator[Tuple[int, Optional[str]]]:
+        """(rule index, version or None) for each match in text"""
+        if self.pattern is None:
+            return
+        for match in self.pattern.finditer(text):
+            rule, inner = self.groups[match.lastindex]
+            yield rule, match.group(match.lastindex + 1) if inner else None
+
+
+class FingerprintEngine:
+    """Compiled CMS rules; detect() weighs the evidence for every vendor at once"""
+
+    def __init__(self, rules: Mapping[str, Dict]):
+        self.names = list(rules)
+        self.categories = [rules[name].get('category') for name in self.names]
+
+        generator = []
+        headers: Dict[str, List[Tuple[str, int]]] = {}
+        literals = {'cookies': {}, 'scripts': {}, 'html': {}}
+        for index, name in enumerate(self.names):
+            rule = rules[name]
+            generator.extend((pattern, index) for pattern in rule.get('generator', []))
+            for header, patterns in rule.get('headers', {}).items():
+                headers.setdefault(header.lower(), []).extend((pattern, index) for pattern in patterns)
+            for kind, needles in literals.items():
+                for needle in rule.get(kind, []):
+                    needles.setdefault(needle.lower(), []).append(index)
+
+        self.generator = PatternMatcher(generator)
+        self.headers = {header: PatternMatcher(patterns) for header, patterns in headers.items()}
+        self.cookies = LiteralMatcher(literals['cookies'], prefix=True)
+        self.scripts = LiteralMatcher(literals['scripts'])
+        self.html = LiteralMatcher(literals['html'])
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_RULES_PATH) -> 'FingerprintEngine':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def detect(self, html: str = '', headers: Optional[Mapping[str, str]] = None,
+               generator: Optional[str] = None, urls: Iterable[str] = ()) -> Dict:
+        """The best-supported CMS for a page
+
+        Returns 'cms' (None when no rule matched), 'confidence' (0-1),
+        'version' (from the generator tag or a header, when they carry
+        one), 'category' and the 'signals' that matched it.
+        """
+        evidence: Dict[int, Dict[str, Optional[str]]] = {}  # Rule -> signal -> version
+
+        def add(rule: int, signal: str, version: Optional[str] = None):
+            found = evidence.setdefault(rule, {})
+            if not found.get(signal):
+                found[signal] = version
+
+        for name, value in (headers or {}).items():
+            name = name.lower()
+            if name == 'set-cookie':
+                cookie_names = '\n'.join(COOKIE_NAME.findall(value)).lower()
+                for rule in self.cookies.find(cookie_names):
+                    add(rule, 'cookie')
+            elif name in self.headers:
+                for rule, version in self.headers[name].find(value):
+                    add(rule, 'header', version)
+
+        if generator:
+            for rule, version in self.generator.find(generator):
+                add(rule, 'generator', version)
+        for rule in self.scripts.find('\n'.join(urls).lower()):
+            add(rule, 'script')
+        for rule in self.html.find(html.lower()):
+            add(rule, 'html')
+
+        if not evidence:
+            return {'cms': None, 'confidence': 0.0, 'version': None, 'category': None, 'signals': []}
+
+        def confidence(signals: Dict[str, Optional[str]]) -> float:
+            missing = 1.0
+            for signal in signals:
+                missing *= 1 - SIGNAL_WEIGHTS[signal]
+            return 1 - missing
+
+        # Ties go to the rule listed first in the file
+        best = max(evidence, key=lambda rule: (confidence(evidence[rule]), -rule))
+        signals = evidence[best]
+        return {
+            'cms': self.names[best],
+            'confidence': round(confidence(signals), 3),
+            'version': signals.get('generator') or signals.get('header'),
+            'category': self.categories[best],
+            'signals': sorted(signals),
+        }
+
+
+@lru_cache(maxsize=None)
+def load_engine(path: str = DEFAULT_RULES_PATH) -> FingerprintEngine:
+    """The compiled engine for a rule file, built once per process"""
+    return FingerprintEngine.load(path)
@@ -8,27 +8,106 @@ import requests
 import sqlite3
 import time
 import logging
-from typing import Optional, Dict, List
-import re
-from urllib.parse import urljoin
+from typing import Optional, Dict, List, Tuple
+from urllib.parse import urlparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from bs4 import BeautifulSoup
-import json
+import heapq
+import argparse
+
+from http_cache import DEFAULT_CACHE_PATH, install_cache, normalize_url
+from bounded_fetch import DEFAULT_MAX_BYTES, ContentRejected, fetch_page
+from pipeline_checkpoints import CheckpointStore, Deadline
+from work_queue import WorkQueue, drain
+from municipality_resolution import resolve_municipalities
+from host_throttle import HostController
+from domain_discovery import DomainDiscovery
+from gov_registry import GovRegistry
+from html_extraction import (
+    ParsePool, extract_contact_page, extract_emails, extract_officials,
+    extract_phones, find_contact_links, find_contact_links_page
+)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# DuckDuckGo instant answer API (no API key required)
+SEARCH_URL = "https://api.duckduckgo.com/"
+
+# Website discovery modes: candidate-domain probing, search API, or probing
+# with search as the fallback
+DISCOVERY_MODES = ('probe', 'search', 'both')
+
+# Contacts worth enriching: missing a website or email, small enough to be a
+# prospect, and the canonical row of their municipality
+ENRICH_CANDIDATES = """
+    (website IS NULL OR email IS NULL) AND population < 25000
+    AND (gc.municipality_id IS NULL OR gc.id = (
+        SELECT canonical_contact_id FROM municipalities m WHERE m.id = gc.municipality_id
+    ))
+"""
+
+# Queued contacts finished longer ago than this are queued again, for those
+# still missing a website or email
+REQUEUE_AFTER = 30 * 24 * 3600
+
+class ContactPageFrontier:
+    """Priority queue of contact page URLs for one site; each URL is queued once"""
+    
+    def __init__(self, website: str):
+        self.seen = {normalize_url(website)}
+        self._heap = []
+    
+    def add(self, links: List[Tuple[float, str]]):
+        for score, url in links:
+            key = normalize_url(url)
+            if key not in self.seen:
+                self.seen.add(key)
+                heapq.heappush(self._heap, (-score, len(self.seen), url))
+    
+    def pop(self) -> Optional[str]:
+        return heapq.heappop(self._heap)[2] if self._heap else None
+
 class ContactEnricher:
     """Enriches government contacts with additional information"""
     
-    def __init__(self, db_path: str = "government_contacts.db"):
+    def __init__(self, db_path: str = "government_contacts.db",
+                 http_cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                 parse_workers: Optional[int] = None, host_delay: float = 2.0,
+                 search_url: str = SEARCH_URL, discovery: str = 'both',
+                 gov_registry_path: Optional[str] = None, max_page_bytes: int = DEFAULT_MAX_BYTES):
         self.db_path = db_path
+        self.max_page_bytes = max_page_bytes
+        self.search_url = search_url
+        self.discovery = discovery
+        # Municipal hosts start at the host delay and adapt; the search API
+        # never goes below its one-second spacing
+        self.hosts = HostController(host_delay, {urlparse(search_url).netloc: 1.0})
+        self.parse_pool = ParsePool(parse_workers)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        if http_cache_path:
+            install_cache(self.session, path=http_cache_path)
+        self.checkpoints = CheckpointStore(db_path)
+        self.domain_discovery = DomainDiscovery(db_path, self.session, self.hosts)
+        self.gov_registry = GovRegistry.load(gov_registry_path) if gov_registry_path else None
     
     def find_municipality_website(self, municipality: str, state: str) -> Optional[str]:
         """Find official municipality website"""
+        if self.gov_registry:
+            website = self.gov_registry.match(municipality, state)
+            if website:
+                return website
+        if self.discovery in ('probe', 'both'):
+            website = self.domain_discovery.discover(municipality, state)
+            if website or self.discovery == 'probe':
+                return website
+        return self.search_municipality_website(municipality, state)
+    
+    def search_municipality_website(self, municipality: str, state: str) -> Optional[str]:
+        """Find official municipality website through the search API"""
         search_queries = [
             f"{municipality} {state} city government official website",
             f"{municipality} {state} town hall contact",
@@ -38,8 +117,12 @@ class ContactEnricher:
         for query in search_queries:
             try:
                 # Use DuckDuckGo for search (no API key required)
-                url = f"https://api.duckduckgo.com/?q={query}&format=json&no_redirect=1"
-                response = self.session.get(url, timeout=10)
+                with self.hosts.request(self.search_url, timeout=10) as slot:  # Rate limiting
+                    response = self.session.get(
+                        self.search_url, params={'q': query, 'format': 'json', 'no_redirect': 1},
+                        timeout=slot.timeout
+                    )
+                    slot.record(response)
                 data = response.json()
                 
                 # Look for .gov domains in results
@@ -48,15 +131,19 @@ class ContactEnricher:
                     if '.gov' in url and municipality.lower() in url.lower():
                         return url
                 
-                time.sleep(1)  # Rate limiting
-                
             except Exception as e:
                 logger.error(f"Search error for {municipality}, {state}: {e}")
         
         return None
     
-    def scrape_municipality_contacts(self, website: str, municipality: str, state: str) -> Dict:
-        """Scrape contact information from municipality website"""
+    def scrape_municipality_contacts(self, website: str, municipality: str, state: str,
+                                     max_pages: int = 3) -> Dict:
+        """Scrape contact information from municipality website
+        
+        Up to max_pages same-site contact pages are fetched from a frontier
+        in priority order, adding the links each page reveals, and the
+        crawl stops once a clerk email and a phone number have been found.
+        """
         contacts = {
             'emails': [],
             'phones': [],
@@ -64,30 +151,43 @@ class ContactEnricher:
         }
         
         try:
-            response = self.session.get(website, timeout=30)
-            soup = BeautifulSoup(response.content, 'html.parser')
+            with self.hosts.request(website, timeout=30) as slot:
+                response = fetch_page(self.session, website, timeout=slot.timeout, max_bytes=self.max_page_bytes)
+                slot.record(response)
             
             # Common pages to check for contacts
-            contact_links = self.find_contact_pages(soup, website)
+            frontier = ContactPageFrontier(response.url)
+            frontier.add(self.parse_pool.submit(find_contact_links_page, response.content, response.url).result())
             
-            for link in contact_links[:3]:  # Limit to 3 pages
+            for _ in range(max_pages):
+                link = frontier.pop()
+                if link is None:
+                    break
                 try:
-                    page_response = self.session.get(link, timeout=20)
-                    page_soup = BeautifulSoup(page_response.content, 'html.parser')
+                    with self.hosts.request(link, timeout=20) as slot:  # Be respectful
+                        page_response = fetch_page(self.session, link, timeout=slot.timeout,
+                                                   max_bytes=self.max_page_bytes)
+                        slot.record(page_response)
+                    page_response.raise_for_status()
                     
                     # Extract contact information
-                    contacts['emails'].extend(self.extract_emails(page_soup))
-                    contacts['phones'].extend(self.extract_phones(page_soup))
-                    contacts['officials'].extend(self.extract_officials(page_soup))
-                    
-                    time.sleep(2)  # Be respectful
-                    
+                    page = self.parse_pool.submit(extract_contact_page, page_response.content, page_response.url).result()
+                    contacts['emails'].extend(page['emails'])
+                    contacts['phones'].extend(page['phones'])
+                    contacts['officials'].extend(page['officials'])
+                    frontier.add(page['links'])
+                except ContentRejected as e:
+                    # PDFs, agenda packets and the like never reach the parser
+                    logger.info(f"Skipping page: {e}")
                 except Exception as e:
                     logger.error(f"Error scraping page {link}: {e}")
+                
+                if contacts['phones'] and any('clerk' in email.lower() for email in contacts['emails']):
+                    break
             
-            # Remove duplicates
-            contacts['emails'] = list(set(contacts['emails']))
-            contacts['phones'] = list(set(contacts['phones']))
+            # Remove duplicates, clerk addresses first
+            contacts['emails'] = sorted(dict.fromkeys(contacts['emails']), key=lambda email: 'clerk' not in email.lower())
+            contacts['phones'] = list(dict.fromkeys(contacts['phones']))
             
         except Exception as e:
             logger.error(f"Error scraping {website}: {e}")
@@ -96,117 +196,175 @@ class ContactEnricher:
     
     def find_contact_pages(self, soup: BeautifulSoup, base_url: str) -> List[str]:
         """Find contact and staff pages on the website"""
-        contact_keywords = [
-            'contact', 'staff', 'directory', 'city-clerk', 'city-manager',
-            'mayor', 'council', 'departments', 'phone', 'email'
-        ]
-        
-        contact_links = []
-        
-        for link in soup.find_all('a', href=True):
-            href = link['href'].lower()
-            text = link.get_text().lower()
-            
-            if any(keyword in href or keyword in text for keyword in contact_keywords):
-                full_url = urljoin(base_url, link['href'])
-                contact_links.append(full_url)
-        
-        return contact_links
+        return find_contact_links(soup, base_url)
     
     def extract_emails(self, soup: BeautifulSoup) -> List[str]:
         """Extract email addresses from page"""
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        text = soup.get_text()
-        
-        emails = re.findall(email_pattern, text)
-        
-        # Filter for relevant government emails
-        gov_emails = []
-        for email in emails:
-            if any(domain in email.lower() for domain in ['.gov', '.org']) and \
-               any(role in email.lower() for role in ['clerk', 'mayor', 'manager', 'admin', 'city', 'town']):
-                gov_emails.append(email)
-        
-        return gov_emails
+        return extract_emails(soup)
     
     def extract_phones(self, soup: BeautifulSoup) -> List[str]:
         """Extract phone numbers from page"""
-        phone_patterns = [
-            r'\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b',
-            r'\(\d{3}\)\s?\d{3}[-.\s]?\d{4}'
-        ]
-        
-        phones = []
-        text = soup.get_text()
-        
-        for pattern in phone_patterns:
-            matches = re.findall(pattern, text)
-            phones.extend(matches)
-        
-        return phones
+        return extract_phones(soup)
     
     def extract_officials(self, soup: BeautifulSoup) -> List[Dict]:
         """Extract official names and titles from page"""
-        officials = []
-        
-        # Look for common official title patterns
-        title_patterns = [
-            r'(Mayor|City Manager|City Clerk|Town Clerk|Administrator):\s*([A-Za-z\s.]+)',
-            r'([A-Za-z\s.]+),\s*(Mayor|City Manager|City Clerk|Town Clerk|Administrator)'
-        ]
+        return extract_officials(soup)
+    
+    def enrich_contacts(self, limit: int = 100, deadline: Optional[Deadline] = None,
+                        restart: bool = False, concurrency: int = 8):
+        """Enrich contacts in database with additional information
         
-        text = soup.get_text()
+        Up to `concurrency` municipalities are enriched at once. Progress is
+        checkpointed per contact; an interrupted run (crash or expired
+        deadline) resumes with the contacts it had not finished.
+        """
+        deadline = deadline or Deadline()
+        run_id = self.checkpoints.begin_stage('enrich', restart=restart)
         
-        for pattern in title_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for match in matches:
-                if len(match) == 2:
-                    title, name = match
-                    officials.append({
-                        'name': name.strip(),
-                        'title': title.strip()
-                    })
+        # Only the canonical row of each municipality is enriched
+        resolve_municipalities(self.db_path)
+        if self.gov_registry:
+            # One offline pass fills in every website the registry knows
+            self.gov_registry.fill_websites(self.db_path)
+        remaining = max(limit - len(self.checkpoints.done_items('enrich')), 0)
         
-        return officials
-    
-    def enrich_contacts(self, limit: int = 100):
-        """Enrich contacts in database with additional information"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Get contacts without websites or emails
-        cursor.execute("""
-            SELECT id, municipality, state FROM government_contacts 
-            WHERE (website IS NULL OR email IS NULL) AND population < 25000
+        # Get contacts without websites or emails, skipping ones finished in this run
+        cursor.execute(f"""
+            SELECT id, municipality, state, website FROM government_contacts gc
+            WHERE {ENRICH_CANDIDATES}
+            AND NOT EXISTS (
+                SELECT 1 FROM pipeline_checkpoints pc
+                WHERE pc.stage = 'enrich' AND pc.item = CAST(gc.id AS TEXT)
+                AND pc.run_id = ? AND pc.status = 'done'
+            )
             ORDER BY population DESC
             LIMIT ?
-        """, (limit,))
+        """, (run_id, remaining))
         
         contacts_to_enrich = cursor.fetchall()
+        conn.close()
         
-        logger.info(f"Enriching {len(contacts_to_enrich)} contacts...")
+        logger.info(f"Enriching {len(contacts_to_enrich)} contacts with concurrency {concurrency}...")
         
-        for contact_id, municipality, state in contacts_to_enrich:
-            logger.info(f"Enriching {municipality}, {state}...")
-            
-            # Find website if not present
-            website = self.find_municipality_website(municipality, state)
-            
-            if website:
-                # Scrape contact information
-                contact_info = self.scrape_municipality_contacts(website, municipality, state)
+        started = time.monotonic()
+        processed = 0
+        stopped_early = False
+        pending = iter(contacts_to_enrich)
+        
+        # Keep at most `concurrency` towns in flight; per-host politeness is
+        # enforced by self.hosts inside the fetches themselves
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            in_flight = set()
+            while True:
+                while len(in_flight) < max(concurrency, 1) and not stopped_early:
+                    if deadline.expired():
+                        logger.info(f"Deadline reached after {processed} contacts; progress saved for the next run")
+                        stopped_early = True
+                        break
+                    contact = next(pending, None)
+                    if contact is None:
+                        break
+                    in_flight.add(executor.submit(self.enrich_contact, *contact))
                 
-                # Update database
-                self.update_contact_info(contact_id, website, contact_info)
+                if not in_flight:
+                    break
                 
-                time.sleep(3)  # Be respectful
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                processed += len(finished)
+                
+                # Progress indicator
+                if processed % 10 < len(finished):
+                    logger.info(f"Processed {processed} contacts...")
+        
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed * 3600 if elapsed > 0 else 0
+        logger.info(f"Enriched {processed} contacts in {elapsed:.1f}s ({rate:.0f} per hour)")
+        
+        if stopped_early:
+            return
+        self.checkpoints.finish_stage('enrich')
+        logger.info("Contact enrichment complete!")
+    
+    def enrich_contact(self, contact_id: int, municipality: str, state: str, website: Optional[str] = None):
+        """Enrich a single contact, checkpointing the outcome"""
+        self.checkpoints.mark_started('enrich', contact_id)
+        
+        try:
+            self.enrich_website(contact_id, municipality, state, website)
+            self.checkpoints.mark_done('enrich', contact_id)
+        except Exception as e:
+            logger.error(f"Error enriching {municipality}, {state}: {e}")
+            self.checkpoints.mark_failed('enrich', contact_id, str(e))
+    
+    def enrich_website(self, contact_id: int, municipality: str, state: str, website: Optional[str] = None):
+        """Find and scrape a contact's website and store what it lists"""
+        logger.info(f"Enriching {municipality}, {state}...")
+        
+        # Find website if not present
+        website = website or self.find_municipality_website(municipality, state)
+        
+        if website:
+            # Scrape contact information
+            contact_info = self.scrape_municipality_contacts(website, municipality, state)
             
-            # Progress indicator
-            if contact_id % 10 == 0:
-                logger.info(f"Processed {contact_id} contacts...")
+            # Update database
+            self.update_contact_info(contact_id, website, contact_info)
+    
+    def enrich_from_queue(self, limit: int = 100, deadline: Optional[Deadline] = None,
+                          restart: bool = False, concurrency: int = 8,
+                          requeue_after: float = REQUEUE_AFTER) -> Dict[str, int]:
+        """Enrich contacts as one of possibly many workers sharing the work queue
         
+        Up to `limit` contacts not yet queued, or last finished more than
+        requeue_after seconds ago, are added to the 'enrich' queue (limit=0
+        only drains), then tasks are leased and processed until none remain.
+        restart drops every task no worker holds a lease on. Returns this
+        worker's task counts.
+        """
+        queue = WorkQueue(self.db_path)
+        if restart:
+            queue.reset('enrich')
+        reopen_before = time.time() - requeue_after
+        
+        # Only the canonical row of each municipality is enriched
+        resolve_municipalities(self.db_path)
+        if self.gov_registry:
+            self.gov_registry.fill_websites(self.db_path)
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT id, municipality, state, website, population FROM government_contacts gc
+            WHERE {ENRICH_CANDIDATES}
+            AND NOT EXISTS (
+                SELECT 1 FROM work_queue wq WHERE wq.queue = 'enrich' AND wq.item = CAST(gc.id AS TEXT)
+                AND NOT (wq.status IN ('done', 'dead') AND wq.updated_at < ?)
+            )
+            ORDER BY population DESC
+            LIMIT ?
+        """, (reopen_before, limit))
+        added = queue.enqueue('enrich', (
+            (contact_id, {'municipality': municipality, 'state': state, 'website': website}, population or 0)
+            for contact_id, municipality, state, website, population in cursor.fetchall()
+        ), reopen_before=reopen_before)
         conn.close()
-        logger.info("Contact enrichment complete!")
+        logger.info(f"Queued {added} contacts; worker {queue.worker_id} draining with concurrency {concurrency}")
+        
+        started = time.monotonic()
+        counts = drain(
+            queue, 'enrich',
+            lambda item, payload: self.enrich_website(int(item), **payload),
+            concurrency=concurrency, deadline=deadline
+        )
+        
+        elapsed = time.monotonic() - started
+        rate = counts['done'] / elapsed * 3600 if elapsed > 0 else 0
+        logger.info(f"Enriched {counts['done']} contacts in {elapsed:.1f}s ({rate:.0f} per hour); "
+                    f"queue now {queue.counts('enrich')}")
+        return counts
     
     def update_contact_info(self, contact_id: int, website: str, contact_info: Dict):
         """Update contact information in database"""
@@ -228,7 +386,8 @@ class ContactEnricher:
         cursor.execute("""
             UPDATE government_contacts 
             SET website = ?, email = COALESCE(email, ?), phone = COALESCE(phone, ?),
-                contact_name = COALESCE(contact_name, ?), title = COALESCE(title, ?)
+                contact_name = COALESCE(contact_name, ?), title = COALESCE(title, ?),
+                last_updated = CURRENT_TIMESTAMP
             WHERE id = ?
         """, (website, email, phone, contact_name, title, contact_id))
         
@@ -250,13 +409,52 @@ class LinkedInFinder:
 
 def main():
     """Main execution function"""
-    enricher = ContactEnricher()
+    parser = argparse.ArgumentParser(description="Government Contact Enrichment Tool")
+    parser.add_argument('--limit', type=int, default=50, help="Maximum contacts to enrich")
+    parser.add_argument('--deadline', type=float,
+                        help="Stop cleanly after this many seconds, keeping the checkpoint")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore an unfinished run and start from scratch")
+    parser.add_argument('--parse-workers', type=int,
+                        help="HTML parsing processes (default: CPU count, 0 parses inline)")
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="Municipalities enriched at the same time")
+    parser.add_argument('--host-delay', type=float, default=2.0,
+                        help="Initial seconds between requests to a municipal host (adapts to its latency)")
+    parser.add_argument('--requeue-days', type=float, default=REQUEUE_AFTER / 86400,
+                        help="With --queue, enrich contacts again once their last run is this many days old")
+    parser.add_argument('--search-url', default=SEARCH_URL,
+                        help="Search API endpoint (point at a local stand-in for benchmarking)")
+    parser.add_argument('--discovery', choices=DISCOVERY_MODES, default='both',
+                        help="Website discovery: probe candidate domains, search, or probe then search")
+    parser.add_argument('--gov-registry',
+                        help="Local copy of the .gov domain list (CSV) to match websites offline")
+    parser.add_argument('--queue', action='store_true',
+                        help="Work from the shared queue so several workers can enrich together")
+    args = parser.parse_args()
+    
+    enricher = ContactEnricher(parse_workers=args.parse_workers, host_delay=args.host_delay,
+                               search_url=args.search_url, discovery=args.discovery,
+                               gov_registry_path=args.gov_registry)
     
     print("🔍 Government Contact Enrichment Tool")
     print("=" * 40)
     
     # Enrich contacts with websites and additional info
-    enricher.enrich_contacts(limit=50)  # Start with 50 for testing
+    if args.queue:
+        enricher.enrich_from_queue(limit=args.limit, deadline=Deadline(args.deadline),
+                                   restart=args.restart, concurrency=args.concurrency,
+                                   requeue_after=args.requeue_days * 86400)
+    else:
+        enricher.enrich_contacts(limit=args.limit, deadline=Deadline(args.deadline),
+                                 restart=args.restart, concurrency=args.concurrency)
+    enricher.parse_pool.close()
+    enricher.domain_discovery.close()
+    
+    # Slowest hosts seen this run, for tuning --host-delay and --concurrency
+    host_state = enricher.hosts.state()
+    for host, state in sorted(host_state.items(), key=lambda item: -(item[1]['p99'] or 0))[:5]:
+        logger.info(f"Host {host}: {state}")
     
     print("✅ Contact enrichment complete!")
 
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Municipal Website Discovery
+Finds a municipality's website by generating ranked candidate hostnames,
+resolving them concurrently and probing the survivors with HEAD requests.
+Every outcome is remembered in the contacts database, so dead candidates
+are never looked up again and repeat discovery is mostly local work.
+Candidates whose hostname carries no state ("cityofspringfield.gov") are
+only accepted when their page names the municipality's state.
+"""
+
+import logging
+import re
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from bounded_fetch import ContentRejected, fetch_page
+from host_throttle import HostController
+from municipality_resolution import normalize_municipality_name
+
+logger = logging.getLogger(__name__)
+
+STATE_ABBREVIATIONS = {
+    'Alabama': 'al', 'Alaska': 'ak', 'Arizona': 'az', 'Arkansas': 'ar', 'California': 'ca',
+    'Colorado': 'co', 'Connecticut': 'ct', 'Delaware': 'de', 'District of Columbia': 'dc',
+    'Florida': 'fl', 'Georgia': 'ga', 'Hawaii': 'hi', 'Idaho': 'id', 'Illinois': 'il',
+    'Indiana': 'in', 'Iowa': 'ia', 'Kansas': 'ks', 'Kentucky': 'ky', 'Louisiana': 'la',
+    'Maine': 'me', 'Maryland': 'md', 'Massachusetts': 'ma', 'Michigan': 'mi', 'Minnesota': 'mn',
+    'Mississippi': 'ms', 'Missouri': 'mo', 'Montana': 'mt', 'Nebraska': 'ne', 'Nevada': 'nv',
+    'New Hampshire': 'nh', 'New Jersey': 'nj', 'New Mexico': 'nm', 'New York': 'ny',
+    'North Carolina': 'nc', 'North Dakota': 'nd', 'Ohio': 'oh', 'Oklahoma': 'ok', 'Oregon': 'or',
+    'Pennsylvania': 'pa', 'Rhode Island': 'ri', 'South Carolina': 'sc', 'South Dakota': 'sd',
+    'Tennessee': 'tn', 'Texas': 'tx', 'Utah': 'ut', 'Vermont': 'vt', 'Virginia': 'va',
+    'Washington': 'wa', 'West Virginia': 'wv', 'Wisconsin': 'wi', 'Wyoming': 'wy',
+    'Puerto Rico': 'pr',
+}
+
+# Hostname patterns, most likely first; {name} is the squashed municipality
+# name and {st} the two-letter state code
+CANDIDATE_PATTERNS = (
+    '{name}{st}.gov', 'cityof{name}.gov', '{name}.gov', 'townof{name}.gov',
+    'cityof{name}{st}.gov', 'villageof{name}.gov', '{name}-{st}.gov',
+    'cityof{name}.org', 'townof{name}.org', '{name}{st}.org', 'cityof{name}.com',
+    'ci.{name}.{st}.us', '{name}.{st}.us',
+)
+
+# Bytes of a stateless candidate's page searched for state names
+VERIFY_BYTES = 256 * 1024  # Enough to reach the footer address of most town pages
+
+# HEAD answers that show a live site (405: server only refuses the method)
+LIVE_STATUSES = set(range(200, 400)) | {405}
+
+# Resolver errors that mean the name does not exist, as opposed to a
+# transient failure that should not be remembered
+NO_SUCH_HOST_ERRORS = {
+    getattr(socket, name) for name in ('EAI_NONAME', 'EAI_NODATA') if hasattr(socket, name)
+}
+
+
+# State names (longest first, so "West Virginia" is not read as "Virginia")
+# and "Town, ST" abbreviations as they appear in page titles and addresses
+STATE_NAME = re.compile(
+    r'\b(' + '|'.join(sorted(map(re.escape, STATE_ABBREVIATIONS), key=len, reverse=True)) + r')\b',
+    re.IGNORECASE
+)
+STATE_CODE = re.compile(r',\s*([A-Z]{2})\b')
+STATE_NAMES = {code.upper(): name for name, code in STATE_ABBREVIATIONS.items()}
+STATE_NAMES_LOWER = {name.lower(): name for name in STATE_ABBREVIATIONS}
+
+
+def candidate_hostnames(municipality: str, state: str) -> List[Tuple[str, bool]]:
+    """Ranked (hostname, names the state) candidates for a municipality's website"""
+    name = re.sub(r'[^a-z0-9]', '', normalize_municipality_name(municipality, state))
+    st = STATE_ABBREVIATIONS.get(state)
+    if not name:
+        return []
+
+    hosts = []
+    seen = set()
+    for pattern in CANDIDATE_PATTERNS:
+        if '{st}' in pattern and not st:
+            continue
+        domain = pattern.format(name=name, st=st)
+        for host in (f"www.{domain}", domain):
+            if host not in seen:
+                seen.add(host)
+                hosts.append((host, '{st}' in pattern))
+    return hosts
+
+
+def page_states(text: str) -> List[str]:
+    """State names a page mentions, by name or as a ", ST" abbreviation"""
+    states = {STATE_NAMES_LOWER[match.lower()] for match in STATE_NAME.findall(text)}
+    states.update(STATE_NAMES[code] for code in STATE_CODE.findall(text) if code in STATE_NAMES)
+    return sorted(states)
+
+
+class DomainDiscovery:
+    """Concurrent DNS + HEAD probing of candidate hosts with a persistent result cache
+
+    Each host is recorded as 'alive' (with the URL it answered on), 'dead'
+    (the name does not resolve) or 'down' (resolves, but no HTTP answer).
+    Recorded failures are not retried until negative_ttl has passed. For
+    hosts without a state in their name, the states their page mentions
+    are recorded too, and that answer is rechecked after alive_ttl, since
+    such a name can change hands or serve a different town.
+    """
+
+    def __init__(self, db_path: str, session: Optional[requests.Session] = None,
+                 hosts: Optional[HostController] = None, workers: int = 16,
+                 timeout: float = 5.0, negative_ttl: float = 90 * 24 * 3600,
+                 alive_ttl: float = 30 * 24 * 3600):
+        self.db_path = db_path
+        self.session = session or requests.Session()
+        self.hosts = hosts or HostController()
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.alive_ttl = alive_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._results: Dict[str, Tuple[str, Optional[str], float, Optional[str]]] = {}
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS domain_probes (
+                host TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                url TEXT,
+                checked_at REAL NOT NULL,
+                states TEXT
+            )
+        ''')
+        if 'states' not in {row[1] for row in conn.execute("PRAGMA table_info(domain_probes)")}:
+            conn.execute("ALTER TABLE domain_probes ADD COLUMN states TEXT")
+        rows = conn.execute("SELECT host, status, url, checked_at, states FROM domain_probes")
+        for host, status, url, checked_at, states in rows:
+            self._results[host] = (status, url, checked_at, states)
+        conn.commit()
+        conn.close()
+
+    def discover(self, municipality: str, state: str) -> Optional[str]:
+        """Return the URL of the best-ranked live candidate, or None
+
+        All candidates are checked at once; the answer is returned as soon
+        as every better-ranked candidate has failed, and unstarted checks
+        are cancelled.
+        """
+        futures = [self._executor.submit(self.check_host, host, None if named else state)
+                   for host, named in candidate_hostnames(municipality, state)]
+        try:
+            for future in futures:
+                url = future.result()
+                if url:
+                    return url
+        finally:
+            for future in futures:
+                future.cancel()
+        return None
+
+    def check_host(self, host: str, state: Optional[str] = None) -> Optional[str]:
+        """Resolve and probe one host, using the cached outcome when there is one
+
+        With state, a live host only counts if its page mentions that state.
+        """
+        cached = self.cached(host, stateless=state is not None)
+        if cached:
+            status, url, states = cached
+            if status != 'alive':
+                return None
+            if state is None:
+                return url
+            if states is None:
+                states = self.verify(host, url)
+            return url if states is not None and state in states.split(',') else None
+
+        try:
+            socket.getaddrinfo(host, 443, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            if e.errno in NO_SUCH_HOST_ERRORS:
+                self.record(host, 'dead')
+            return None
+        except (OSError, UnicodeError):
+            return None
+
+        for scheme in ('https', 'http'):
+            url = f"{scheme}://{host}/"
+            try:
+                with self.hosts.request(url, timeout=self.timeout) as slot:
+                    response = self.session.head(url, allow_redirects=True, timeout=slot.timeout)
+                    slot.record(response)
+            except requests.RequestException:
+                continue
+            if response.status_code in LIVE_STATUSES:
+                self.record(host, 'alive', response.url)
+                if state is None:
+                    return response.url
+                states = self.verify(host, response.url)
+                return response.url if states is not None and state in states.split(',') else None
+
+        self.record(host, 'down')
+        return None
+
+    def verify(self, host: str, url: str) -> Optional[str]:
+        """Fetch the start of a live host's page and record the states it names
+
+        Returns the comma-separated state names, or None if the page could
+        not be fetched.
+        """
+        try:
+            with self.hosts.request(url, timeout=self.timeout) as slot:
+                page = fetch_page(self.session, url, timeout=slot.timeout, prefix_bytes=VERIFY_BYTES)
+                slot.record(page)
+        except (requests.RequestException, ContentRejected):
+            return None
+        states = ','.join(page_states(page.content.decode(page.encoding or 'utf-8', errors='replace')))
+        self.record(host, 'alive', url, states)
+        return states
+
+    def cached(self, host: str, stateless: bool = False) -> Optional[Tuple[str, Optional[str], Optional[str]]]:
+        """(status, url, states) recorded for a host, unless it has expired
+
+        Failures expire after negative_ttl; for a stateless lookup, live
+        hosts expire after alive_ttl.
+        """
+        with self._lock:
+            result = self._results.get(host)
+        if result is None:
+            return None
+        status, url, checked_at, states = result
+        ttl = self.negative_ttl if status != 'alive' else self.alive_ttl if stateless else None
+        if ttl is not None and time.time() - checked_at > ttl:
+            return None
+        return status, url, states
+
+    def record(self, host: str, status: str, url: Optional[str] = None, states: Optional[str] = None):
+        with self._lock:
+            checked_at = time.time()
+            self._results[host] = (status, url, checked_at, states)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('''
+                INSERT OR REPLACE INTO domain_probes (host, status, url, checked_at, states)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (host, status, url, checked_at, states))
+            conn.commit()
+            conn.close()
+
+    def close(self):
+        self._executor.shutdown()
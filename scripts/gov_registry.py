@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Offline .gov Domain Registry
+In-memory index over a local copy of the public .gov domain list (CSV of
+domain, domain type, organization, city and state), so most municipality
+websites are found without any network lookups
+"""
+
+import csv
+import logging
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from domain_discovery import STATE_ABBREVIATIONS
+from municipality_resolution import municipality_key
+
+logger = logging.getLogger(__name__)
+
+# Header names used by the different releases of the registry CSV
+REGISTRY_COLUMNS = {
+    'domain': ('domain name', 'domain'),
+    'type': ('domain type', 'type'),
+    'organization': ('organization name', 'organization', 'agency'),
+    'city': ('city',),
+    'state': ('state',),
+}
+
+# Domain types that can belong to a municipality; federal, state and
+# tribal domains are never a town's website
+MUNICIPAL_TYPES = ('city', 'municipal', 'town', 'village', 'local')
+
+# A prefix match must cover this much of the name to count as a fuzzy match
+MIN_PREFIX_COVERAGE = 0.85
+
+
+class PrefixTrie:
+    """Character trie over name keys, for prefix-based fuzzy lookups"""
+
+    __slots__ = ('root',)
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, key: str):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+        node[''] = True  # End-of-key marker
+
+    def longest_prefix(self, key: str) -> Optional[str]:
+        """Longest inserted key that is a prefix of key"""
+        node = self.root
+        longest = None
+        for i, char in enumerate(key):
+            node = node.get(char)
+            if node is None:
+                break
+            if '' in node:
+                longest = key[:i + 1]
+        return longest
+
+    def completions(self, prefix: str, limit: int = 2) -> List[str]:
+        """Up to limit inserted keys that start with prefix"""
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        found = []
+        stack = [(node, prefix)]
+        while stack and len(found) < limit:
+            node, key = stack.pop()
+            for char, child in node.items():
+                if char == '':
+                    found.append(key)
+                else:
+                    stack.append((child, key + char))
+        return found[:limit]
+
+
+def state_code(state: str) -> Optional[str]:
+    """Two-letter lowercase code for a state name or code"""
+    state = (state or '').strip()
+    if len(state) == 2:
+        return state.lower()
+    return STATE_ABBREVIATIONS.get(state.title()) or STATE_ABBREVIATIONS.get(state)
+
+
+class GovRegistry:
+    """Municipal .gov domains indexed by (state code, municipality key)"""
+
+    def __init__(self):
+        # (state, key) -> [(rank, domain)], lower rank is a better match
+        self.domains: Dict[Tuple[str, str], List[Tuple[int, str]]] = {}
+        self.tries: Dict[str, PrefixTrie] = {}
+
+    @classmethod
+    def load(cls, path: str) -> 'GovRegistry':
+        """Build the index from a registry CSV file"""
+        registry = cls()
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            header = [name.strip().lower() for name in next(reader, [])]
+            positions = {
+                column: next((header.index(name) for name in names if name in header), None)
+                for column, names in REGISTRY_COLUMNS.items()
+            }
+            if positions['domain'] is None or positions['state'] is None:
+                raise ValueError(f"{path} has no domain/state columns")
+
+            def field(row, column):
+                position = positions[column]
+                return row[position].strip() if position is not None and position < len(row) else ''
+
+            for row in reader:
+                registry.add(field(row, 'domain'), field(row, 'type'), field(row, 'organization'),
+                             field(row, 'city'), field(row, 'state'))
+
+        logger.info(f"Loaded {sum(len(d) for d in registry.domains.values())} municipal .gov domains from {path}")
+        return registry
+
+    def add(self, domain: str, domain_type: str, organization: str, city: str, state: str):
+        domain_type = domain_type.lower()
+        code = state_code(state)
+        if not domain or not code:
+            return
+        if domain_type and not any(kind in domain_type for kind in MUNICIPAL_TYPES):
+            return
+
+        city_key = municipality_key(city, '') if city else ''
+        org_key = municipality_key(organization, '') if organization else ''
+        # The organization naming the town ("City of Abanda") is the strongest
+        # signal; a domain merely located in the town ranks behind it
+        keys = {org_key: 0} if org_key else {}
+        if city_key:
+            keys.setdefault(city_key, 0 if city_key == org_key else 1)
+
+        for key, rank in keys.items():
+            entries = self.domains.setdefault((code, key), [])
+            entries.append((rank, domain.lower()))
+            self.tries.setdefault(code, PrefixTrie()).insert(key)
+
+    def match(self, municipality: str, state: str) -> Optional[str]:
+        """Website URL for a municipality, or None"""
+        code = state_code(state)
+        key = municipality_key(municipality, state)
+        if not code or not key:
+            return None
+
+        entries = self.domains.get((code, key))
+        if entries is None:
+            key = self.fuzzy_key(code, key)
+            entries = self.domains.get((code, key)) if key else None
+        if not entries:
+            return None
+        return f"https://{min(entries)[1]}"
+
+    def fuzzy_key(self, code: str, key: str) -> Optional[str]:
+        """Closest registry key: a unique extension of key, else a prefix of it,
+        either way differing from key by at most a few trailing characters"""
+        trie = self.tries.get(code)
+        if trie is None:
+            return None
+        completions = trie.completions(key)
+        if len(completions) == 1 and len(key) >= len(completions[0]) * MIN_PREFIX_COVERAGE:
+            return completions[0]
+        prefix = trie.longest_prefix(key)
+        if prefix and len(prefix) >= len(key) * MIN_PREFIX_COVERAGE:
+            return prefix
+        return None
+
+    def match_all(self, rows: Iterable[Tuple[int, str, str]]) -> List[Tuple[str, int]]:
+        """(website, contact_id) pairs for every (id, municipality, state) row matched"""
+        matches = []
+        for contact_id, municipality, state in rows:
+            website = self.match(municipality, state)
+            if website:
+                matches.append((website, contact_id))
+        return matches
+
+    def fill_websites(self, db_path: str) -> int:
+        """Set the website of every contact lacking one that the registry knows
+
+        Returns the number of contacts updated.
+        """
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, municipality, state FROM government_contacts WHERE website IS NULL")
+        matches = self.match_all(cursor.fetchall())
+        cursor.executemany(
+            "UPDATE government_contacts SET website = ?, last_updated = CURRENT_TIMESTAMP WHERE id = ?",
+            matches
+        )
+        conn.commit()
+        conn.close()
+
+        logger.info(f"Matched {len(matches)} contacts to .gov registry websites")
+        return len(matches)
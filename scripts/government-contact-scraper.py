@@ -5,16 +5,30 @@ Scrapes public municipal data from various sources to build a contacts database
 """
 
 import requests
-import csv
 import json
-import time
 from bs4 import BeautifulSoup
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Optional
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Iterable, Iterator
 import sqlite3
-import re
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 import logging
+import argparse
+import codecs
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from host_throttle import HostController
+from bounded_fetch import DEFAULT_MAX_BYTES, fetch_page
+from http_cache import DEFAULT_CACHE_PATH, install_cache
+from pipeline_checkpoints import CheckpointStore, Deadline
+from delta_export import export_rows
+from schema_migrations import migrate_contacts
+from municipality_resolution import resolve_municipalities
+from html_extraction import (
+    ParsePool, extract_directory, extract_directory_page, extract_entry_email,
+    extract_entry_phone, extract_entry_website, match_text, parse_directory_entry
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -35,16 +49,235 @@ class GovernmentContact:
     source: Optional[str] = None
     last_updated: Optional[str] = None
 
+# Census API for places (municipalities): name and total population
+CENSUS_API_URL = "https://api.census.gov/data/2020/dec/pl"
+CENSUS_VARIABLES = ("NAME", "P1_001N")
+
+# State municipal leagues with known directory structures (state -> directory URL)
+STATE_MUNICIPAL_LEAGUES = {
+    'Texas': 'https://directory.tml.org/',
+    'North Carolina': 'https://www.nclm.org/people-directory',
+    'California': 'https://www.calcities.org/members',
+    'Florida': 'https://www.flcities.com/directory',
+    'Alabama': 'https://almonline.org/directory'
+}
+
+def load_league_sources(path: str) -> Dict[str, str]:
+    """Load league directory sources from a JSON file mapping state to URL"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# Column order of the tuples accepted by GovernmentContactScraper.save_rows
+CONTACT_COLUMNS = (
+    'municipality', 'state', 'population', 'contact_name', 'title',
+    'email', 'phone', 'website', 'address', 'source'
+)
+
+# Columns filled in after the initial scrape (e.g. by ContactEnricher)
+ENRICHED_COLUMNS = ('contact_name', 'title', 'email', 'phone', 'website', 'address')
+
+# How an incoming value is merged into an existing row on upsert:
+#   keep    - keep the stored value, fill it only when it is NULL
+#   update  - take the incoming value unless it is NULL
+#   replace - always take the incoming value, even NULL
+MERGE_RULES = {
+    'keep': "COALESCE({column}, excluded.{column})",
+    'update': "COALESCE(excluded.{column}, {column})",
+    'replace': "excluded.{column}",
+}
+
+DEFAULT_MERGE_RULES = {
+    'population': 'update',
+    'contact_name': 'keep',
+    'title': 'keep',
+    'phone': 'keep',
+    'website': 'keep',
+    'address': 'keep',
+    'source': 'keep',
+}
+
+def build_upsert_sql(merge_rules: Dict[str, str]) -> str:
+    """Build the INSERT ... ON CONFLICT DO UPDATE statement for save_rows"""
+    assignments = []
+    for column in CONTACT_COLUMNS:
+        if column in ('municipality', 'state', 'email'):
+            continue
+        rule = merge_rules.get(column, 'keep')
+        if rule not in MERGE_RULES:
+            raise ValueError(f"Unknown merge rule for {column}: {rule}")
+        assignments.append((column, MERGE_RULES[rule].format(column=column)))
+    
+    set_clause = ', '.join(f"{column} = {expr}" for column, expr in assignments)
+    changed = ' OR '.join(f"({expr}) IS NOT {column}" for column, expr in assignments)
+    return f'''
+        INSERT INTO government_contacts ({', '.join(CONTACT_COLUMNS)})
+        VALUES ({', '.join('?' * len(CONTACT_COLUMNS))})
+        ON CONFLICT (municipality, state, IFNULL(email, '')) DO UPDATE SET
+            {set_clause}, last_updated = CURRENT_TIMESTAMP
+        WHERE {changed}
+    '''
+
+class CensusPlace:
+    """Compact record for a Census place row"""
+    __slots__ = ('municipality', 'state', 'population')
+    
+    def __init__(self, municipality: str, state: str, population: int):
+        self.municipality = municipality
+        self.state = state
+        self.population = population
+    
+    def to_row(self) -> tuple:
+        """Convert to a save_rows tuple"""
+        return (self.municipality, self.state, self.population,
+                None, None, None, None, None, None, "US Census API")
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator:
+    """Incrementally parse a top-level JSON array, yielding one element at a time
+    
+    Only the element currently being decoded is held in memory, so arbitrarily
+    large responses can be consumed from a network stream or a file.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+    
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buffer = buffer[pos:] + text_decoder.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        return True
+    
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or not fill():
+                return
+    
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of JSON array")
+        char = buffer[pos]
+        
+        if not started:
+            if char != '[':
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+            skip_whitespace()
+            if buffer[pos:pos + 1] == ']':
+                return
+            continue
+        
+        if char == ']':
+            return
+        if char == ',':
+            pos += 1
+            continue
+        
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not fill():
+                    raise
+                continue
+            # A value is only complete once the following delimiter is buffered;
+            # otherwise a number split across chunks could be cut short
+            rest = buffer[end:].lstrip(' \t\r\n')
+            if not eof and (not rest or rest[0] not in ',]'):
+                fill()
+                continue
+            break
+        pos = end
+        yield value
+
+def iter_census_chunks(source, session: requests.Session, params: Dict,
+                       chunk_size: int = 65536) -> Iterator[bytes]:
+    """Yield raw bytes of a Census response from a URL or a saved local file"""
+    if os.path.exists(source):
+        with open(source, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+    else:
+        with session.get(source, params=params, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    yield chunk
+
+class SelectorProfileStore:
+    """Per-domain directory selectors learned from earlier scrapes"""
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._profiles = {}
+        
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS selector_profiles (
+                domain TEXT PRIMARY KEY,
+                container TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        for domain, container, fields in conn.execute("SELECT domain, container, fields FROM selector_profiles"):
+            self._profiles[domain] = {'container': container, 'fields': json.loads(fields)}
+        conn.commit()
+        conn.close()
+    
+    def get(self, domain: str) -> Optional[Dict]:
+        with self._lock:
+            return self._profiles.get(domain)
+    
+    def save(self, domain: str, container: str, fields: Dict[str, List[str]]):
+        with self._lock:
+            self._profiles[domain] = {'container': container, 'fields': fields}
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('''
+                INSERT OR REPLACE INTO selector_profiles (domain, container, fields, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (domain, container, json.dumps(fields)))
+            conn.commit()
+            conn.close()
+
 class GovernmentContactScraper:
     """Main scraper class for collecting government contacts"""
     
-    def __init__(self, db_path: str = "government_contacts.db"):
+    def __init__(self, db_path: str = "government_contacts.db",
+                 league_sources: Optional[Dict[str, str]] = None, host_delay: float = 2.0,
+                 http_cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                 parse_workers: Optional[int] = None):
         self.db_path = db_path
+        self.parse_pool = ParsePool(parse_workers)
+        self.league_sources = dict(STATE_MUNICIPAL_LEAGUES if league_sources is None else league_sources)
+        self.hosts = HostController(host_delay)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        if http_cache_path:
+            install_cache(self.session, path=http_cache_path)
         self.init_database()
+        self.selector_profiles = SelectorProfileStore(db_path)
     
     def init_database(self):
         """Initialize SQLite database for storing contacts"""
@@ -69,171 +302,284 @@ class GovernmentContactScraper:
             )
         ''')
         
+        self.migrate_contact_identity(cursor)
+        migrate_contacts(cursor)
+        
         conn.commit()
         conn.close()
     
+    def migrate_contact_identity(self, cursor: sqlite3.Cursor):
+        """Add the NULL-safe identity index used as the upsert conflict target
+        
+        UNIQUE(municipality, state, email) treats NULL emails as distinct, so
+        earlier runs could store the same Census place several times. Those
+        duplicates are folded into their lowest id before the index is built.
+        """
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_contacts_identity'"
+        )
+        if cursor.fetchone():
+            return
+        
+        cursor.execute("""
+            SELECT MIN(id), GROUP_CONCAT(id) FROM government_contacts
+            GROUP BY municipality, state, IFNULL(email, '')
+            HAVING COUNT(*) > 1
+        """)
+        duplicates = cursor.fetchall()
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'qualified_leads'"
+        )
+        has_leads = cursor.fetchone() is not None
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'lead_score_history'"
+        )
+        has_history = cursor.fetchone() is not None
+        
+        for keep_id, ids in duplicates:
+            drop_ids = [int(i) for i in ids.split(',') if int(i) != keep_id]
+            placeholders = ', '.join('?' * len(drop_ids))
+            for column in ENRICHED_COLUMNS:
+                cursor.execute(f"""
+                    UPDATE government_contacts SET {column} = (
+                        SELECT {column} FROM government_contacts
+                        WHERE id IN ({placeholders}) AND {column} IS NOT NULL
+                        ORDER BY id DESC LIMIT 1
+                    )
+                    WHERE id = ? AND {column} IS NULL
+                """, (*drop_ids, keep_id))
+            if has_leads:
+                # One lead per contact: the merged contact keeps the newest
+                cursor.execute(f"""
+                    DELETE FROM qualified_leads WHERE contact_id IN (?, {placeholders}) AND id != (
+                        SELECT MAX(id) FROM qualified_leads WHERE contact_id IN (?, {placeholders})
+                    )
+                """, (keep_id, *drop_ids, keep_id, *drop_ids))
+                cursor.execute(
+                    f"UPDATE qualified_leads SET contact_id = ? WHERE contact_id IN ({placeholders})",
+                    (keep_id, *drop_ids)
+                )
+            if has_history:
+                cursor.execute(
+                    f"UPDATE lead_score_history SET contact_id = ? WHERE contact_id IN ({placeholders})",
+                    (keep_id, *drop_ids)
+                )
+            cursor.execute(f"DELETE FROM government_contacts WHERE id IN ({placeholders})", drop_ids)
+        
+        if duplicates:
+            logger.info(f"Merged {len(duplicates)} duplicate contact groups")
+        
+        cursor.execute('''
+            CREATE UNIQUE INDEX idx_contacts_identity
+            ON government_contacts (municipality, state, IFNULL(email, ''))
+        ''')
+    
     def save_contact(self, contact: GovernmentContact):
         """Save contact to database"""
+        self.save_contacts([contact])
+        logger.info(f"Saved contact: {contact.municipality}, {contact.state}")
+    
+    def save_contacts(self, contacts: Iterable[GovernmentContact], batch_size: int = 1000,
+                      merge_rules: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+        """Save many contacts over one connection, one transaction per batch
+        
+        Returns counts of inserted, updated, unchanged and skipped contacts.
+        """
+        rows = (
+            (contact.municipality, contact.state, contact.population,
+             contact.contact_name, contact.title, contact.email,
+             contact.phone, contact.website, contact.address, contact.source)
+            for contact in contacts
+        )
+        return self.save_rows(rows, batch_size, merge_rules)
+    
+    def save_rows(self, rows: Iterable[tuple], batch_size: int = 1000,
+                  merge_rules: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+        """Upsert contact rows in CONTACT_COLUMNS order, one transaction per batch
+        
+        Existing rows are updated in place, keeping their id, using the
+        per-column merge_rules (see MERGE_RULES); rows whose merged values are
+        unchanged are not rewritten at all.
+        """
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+        sql = build_upsert_sql({**DEFAULT_MERGE_RULES, **(merge_rules or {})})
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
+        email_index = CONTACT_COLUMNS.index('email')
+        
+        def flush(batch: List[tuple]):
+            existing = 0
+            batch_emails = {}  # (municipality, state) -> emails already in this batch
+            for i, row in enumerate(batch):
+                place = (row[0], row[1])
+                if place in batch_emails and (row[email_index] is None or row[email_index] in batch_emails[place]):
+                    existing += 1
+                    if row[email_index] is None:
+                        batch[i] = row[:email_index] + (batch_emails[place][0],) + row[email_index + 1:]
+                    continue
+                if row[email_index] is None:
+                    # Rows without an email merge into the municipality's
+                    # existing row, even if enrichment has since set its email
+                    cursor.execute("""
+                        SELECT email FROM government_contacts WHERE municipality = ? AND state = ?
+                        ORDER BY email IS NOT NULL, id LIMIT 1
+                    """, (row[0], row[1]))
+                else:
+                    cursor.execute(
+                        "SELECT email FROM government_contacts WHERE municipality = ? AND state = ? AND email = ?",
+                        (row[0], row[1], row[email_index])
+                    )
+                match = cursor.fetchone()
+                if match:
+                    existing += 1
+                    if match[0] != row[email_index]:
+                        batch[i] = row[:email_index] + (match[0],) + row[email_index + 1:]
+                batch_emails.setdefault(place, []).append(batch[i][email_index])
+            try:
+                cursor.executemany(sql, batch)
+                # rowcount, unlike total_changes, leaves out the stats triggers' writes
+                written = cursor.rowcount
+                conn.commit()
+                inserted = len(batch) - existing
+                counts['inserted'] += inserted
+                counts['updated'] += written - inserted
+                counts['unchanged'] += existing - (written - inserted)
+            except sqlite3.Error as e:
+                conn.rollback()
+                counts['skipped'] += len(batch)
+                logger.error(f"Database error: {e}")
         
+        batch = []
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO government_contacts
-                (municipality, state, population, contact_name, title, email, phone, website, address, source)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                contact.municipality, contact.state, contact.population,
-                contact.contact_name, contact.title, contact.email,
-                contact.phone, contact.website, contact.address, contact.source
-            ))
-            conn.commit()
-            logger.info(f"Saved contact: {contact.municipality}, {contact.state}")
-        except sqlite3.Error as e:
-            logger.error(f"Database error: {e}")
+            for row in rows:
+                if not row[0] or not row[1]:
+                    counts['skipped'] += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
         finally:
             conn.close()
+        
+        logger.info(
+            f"Saved contacts: {counts['inserted']} inserted, "
+            f"{counts['updated']} updated, {counts['unchanged']} unchanged, "
+            f"{counts['skipped']} skipped"
+        )
+        return counts
     
-    def scrape_state_municipal_leagues(self) -> List[GovernmentContact]:
-        """Scrape state municipal league directories"""
+    def scrape_state_municipal_leagues(self, max_workers: int = 8) -> List[GovernmentContact]:
+        """Scrape state municipal league directories, one worker per host"""
         contacts = []
         
-        # State municipal leagues with known directory structures
-        state_leagues = {
-            'Texas': 'https://directory.tml.org/',
-            'North Carolina': 'https://www.nclm.org/people-directory',
-            'California': 'https://www.calcities.org/members',
-            'Florida': 'https://www.flcities.com/directory',
-            'Alabama': 'https://almonline.org/directory'
-        }
+        # Group sources by host so each host is crawled sequentially while
+        # different hosts are fetched in parallel
+        sources_by_host = {}
+        for state, url in self.league_sources.items():
+            sources_by_host.setdefault(urlparse(url).netloc.lower(), []).append((state, url))
+        
+        if not sources_by_host:
+            return contacts
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(sources_by_host))) as executor:
+            futures = [
+                executor.submit(self.scrape_league_host, sources)
+                for sources in sources_by_host.values()
+            ]
+            for future in as_completed(futures):
+                contacts.extend(future.result())
+        
+        return contacts
+    
+    def scrape_league_host(self, sources: List[tuple]) -> List[GovernmentContact]:
+        """Scrape every league directory on a single host, honouring the host delay
+        
+        Pages are handed to the parse pool as raw bytes so the next fetch
+        does not wait for parsing.
+        """
+        contacts = []
+        parses = []
         
-        for state, url in state_leagues.items():
+        for state, url in sources:
             try:
-                logger.info(f"Scraping {state} municipal league...")
-                response = self.session.get(url, timeout=30)
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Extract contacts based on common patterns
-                contacts.extend(self.extract_contacts_from_directory(soup, state, url))
-                time.sleep(2)  # Be respectful
-                
+                with self.hosts.request(url, timeout=30) as slot:  # Be respectful
+                    logger.info(f"Scraping {state} municipal league...")
+                    # Directory pages run long, so they get twice the usual cap
+                    response = fetch_page(self.session, url, timeout=slot.timeout, max_bytes=2 * DEFAULT_MAX_BYTES)
+                    slot.record(response)
+                profile = self.selector_profiles.get(urlparse(url).netloc.lower())
+                parses.append((state, url, self.parse_pool.submit(extract_directory_page, response.content, profile)))
             except Exception as e:
                 logger.error(f"Error scraping {state}: {e}")
         
+        for state, url, future in parses:
+            try:
+                # Extract contacts based on common patterns
+                entries, learned = future.result()
+                contacts.extend(self.directory_contacts(entries, learned, state, url))
+            except Exception as e:
+                logger.error(f"Error parsing {state}: {e}")
+        
         return contacts
     
     def extract_contacts_from_directory(self, soup: BeautifulSoup, state: str, source: str) -> List[GovernmentContact]:
-        """Extract contacts from directory HTML"""
-        contacts = []
-        
-        # Common patterns for municipal directories
-        contact_selectors = [
-            '.city-listing', '.municipality', '.member-listing',
-            '.directory-entry', '.contact-card', '.official-listing'
-        ]
-        
-        for selector in contact_selectors:
-            entries = soup.select(selector)
-            if entries:
-                for entry in entries:
-                    contact = self.parse_directory_entry(entry, state, source)
-                    if contact:
-                        contacts.append(contact)
-                break
+        """Extract contacts from directory HTML
         
-        return contacts
+        Uses the learned selector profile for the source's domain when one
+        exists, and probes every known selector only if it stops matching.
+        """
+        domain = urlparse(source).netloc.lower()
+        entries, learned = extract_directory(soup, self.selector_profiles.get(domain))
+        return self.directory_contacts(entries, learned, state, source)
+    
+    def directory_contacts(self, entries: List[Dict], learned: Optional[Dict],
+                           state: str, source: str) -> List[GovernmentContact]:
+        """Turn extracted directory entries into contacts, saving any learned profile"""
+        if learned:
+            self.selector_profiles.save(urlparse(source).netloc.lower(), learned['container'], learned['fields'])
+        return [GovernmentContact(state=state, source=source, **entry) for entry in entries]
     
-    def parse_directory_entry(self, entry, state: str, source: str) -> Optional[GovernmentContact]:
+    def parse_directory_entry(self, entry, state: str, source: str,
+                              field_selectors: Optional[Dict[str, List[str]]] = None) -> Optional[GovernmentContact]:
         """Parse individual directory entry"""
         try:
-            # Extract municipality name
-            municipality = self.extract_text(entry, ['h1', 'h2', 'h3', '.city-name', '.municipality-name'])
-            if not municipality:
-                return None
-            
-            # Extract contact information
-            contact_name = self.extract_text(entry, ['.contact-name', '.official-name', '.name'])
-            title = self.extract_text(entry, ['.title', '.position', '.role'])
-            email = self.extract_email(entry)
-            phone = self.extract_phone(entry)
-            website = self.extract_website(entry)
-            address = self.extract_text(entry, ['.address', '.location'])
-            
-            return GovernmentContact(
-                municipality=municipality,
-                state=state,
-                contact_name=contact_name,
-                title=title,
-                email=email,
-                phone=phone,
-                website=website,
-                address=address,
-                source=source
-            )
+            fields = parse_directory_entry(entry, field_selectors)
+            return GovernmentContact(state=state, source=source, **fields) if fields else None
         except Exception as e:
             logger.error(f"Error parsing entry: {e}")
             return None
     
     def extract_text(self, element, selectors: List[str]) -> Optional[str]:
         """Extract text using multiple selector strategies"""
-        for selector in selectors:
-            found = element.select_one(selector)
-            if found and found.get_text(strip=True):
-                return found.get_text(strip=True)
-        return None
+        return match_text(element, selectors)[0]
     
     def extract_email(self, element) -> Optional[str]:
         """Extract email address from element"""
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        text = element.get_text()
-        matches = re.findall(email_pattern, text)
-        return matches[0] if matches else None
+        return extract_entry_email(element)
     
     def extract_phone(self, element) -> Optional[str]:
         """Extract phone number from element"""
-        phone_pattern = r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'
-        text = element.get_text()
-        matches = re.findall(phone_pattern, text)
-        return matches[0] if matches else None
+        return extract_entry_phone(element)
     
     def extract_website(self, element) -> Optional[str]:
         """Extract website URL from element"""
-        links = element.find_all('a', href=True)
-        for link in links:
-            href = link['href']
-            if href.startswith('http') and any(domain in href for domain in ['.gov', '.org', '.com']):
-                return href
-        return None
-    
-    def scrape_census_data(self) -> List[GovernmentContact]:
+        return extract_entry_website(element)
+    
+    def scrape_census_data(self, source: Optional[str] = None) -> List[GovernmentContact]:
         """Get municipality data from Census API"""
         contacts = []
         
         try:
-            # Census API for places (municipalities)
-            url = "https://api.census.gov/data/2020/dec/pl"
-            params = {
-                "get": "NAME,P1_001N",  # Name and total population
-                "for": "place:*",
-                "in": "state:*"
-            }
-            
-            response = self.session.get(url, params=params, timeout=30)
-            data = response.json()
-            
-            # Skip header row
-            for row in data[1:]:
-                name, population, state_code, place_code = row
-                
-                # Filter for smaller municipalities (under 50k population)
-                if int(population) < 50000:
-                    contact = GovernmentContact(
-                        municipality=name,
-                        state=self.get_state_name(state_code),
-                        population=int(population),
-                        source="US Census API"
-                    )
-                    contacts.append(contact)
+            for place in self.iter_census_places(source):
+                contacts.append(GovernmentContact(
+                    municipality=place.municipality,
+                    state=place.state,
+                    population=place.population,
+                    source="US Census API"
+                ))
             
             logger.info(f"Retrieved {len(contacts)} municipalities from Census")
             
@@ -242,6 +588,50 @@ class GovernmentContactScraper:
         
         return contacts
     
+    def iter_census_places(self, source: Optional[str] = None,
+                           max_population: int = 50000) -> Iterator[CensusPlace]:
+        """Stream Census places from the API, or from a saved response file"""
+        # Census API for places (municipalities)
+        params = {
+            "get": ",".join(CENSUS_VARIABLES),
+            "for": "place:*",
+            "in": "state:*"
+        }
+        rows = iter_json_array(iter_census_chunks(source or CENSUS_API_URL, self.session, params))
+        
+        # Locate columns from the header row so extra variables can be requested
+        header = next(rows, None)
+        if header is None:
+            return
+        name_col = header.index("NAME")
+        population_col = header.index("P1_001N")
+        state_col = header.index("state")
+        
+        for row in rows:
+            try:
+                population = int(row[population_col])
+            except (TypeError, ValueError):
+                continue
+            
+            # Filter for smaller municipalities (under 50k population by default)
+            if population < max_population:
+                yield CensusPlace(row[name_col], self.get_state_name(row[state_col]), population)
+    
+    def ingest_census(self, source: Optional[str] = None, batch_size: int = 1000) -> Dict[str, int]:
+        """Stream Census places straight into the database in batches
+        
+        A failed or truncated fetch is logged and re-raised; the batches
+        saved before it are kept.
+        """
+        try:
+            counts = self.save_rows((place.to_row() for place in self.iter_census_places(source)), batch_size)
+        except Exception as e:
+            logger.error(f"Error ingesting Census data: {e}")
+            raise
+        
+        logger.info(f"Ingested {counts['inserted'] + counts['updated']} municipalities from Census")
+        return counts
+    
     def get_state_name(self, state_code: str) -> str:
         """Convert state FIPS code to state name"""
         state_codes = {
@@ -261,40 +651,42 @@ class GovernmentContactScraper:
         }
         return state_codes.get(state_code, f"State-{state_code}")
     
-    def export_to_csv(self, filename: str = "government_contacts.csv"):
-        """Export database to CSV"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM government_contacts ORDER BY state, municipality")
-        rows = cursor.fetchall()
+    def export_to_csv(self, filename: str = "government_contacts.csv", since: bool = False) -> int:
+        """Export database to CSV or JSONL (gzip-compressed for .gz names)
         
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([
+        With since=True only contacts changed since the previous export to
+        the same filename are written.
+        """
+        where = "WHERE last_updated >= ?" if since else ""
+        count = export_rows(
+            self.db_path, filename,
+            f"""
+                SELECT {', '.join(CONTACT_COLUMNS)}, last_updated FROM government_contacts
+                {where}
+                ORDER BY state, municipality
+            """, (),
+            header=[
                 'Municipality', 'State', 'Population', 'Contact Name', 'Title',
                 'Email', 'Phone', 'Website', 'Address', 'Source', 'Last Updated'
-            ])
-            
-            for row in rows:
-                writer.writerow(row[1:])  # Skip ID column
+            ],
+            keys=[*CONTACT_COLUMNS, 'last_updated'],
+            watermark=f"government_contacts:{os.path.basename(filename)}",
+            since=since
+        )
         
-        logger.info(f"Exported {len(rows)} contacts to {filename}")
-        conn.close()
+        logger.info(f"Exported {count} contacts to {filename}")
+        return count
     
     def get_stats(self) -> Dict:
-        """Get database statistics"""
+        """Get database statistics from the trigger-maintained contact_stats table"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         stats = {}
-        cursor.execute("SELECT COUNT(*) FROM government_contacts")
-        stats['total_contacts'] = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(SUM(contacts), 0), COALESCE(SUM(contacts_with_email), 0) FROM contact_stats")
+        stats['total_contacts'], stats['contacts_with_email'] = cursor.fetchone()
         
-        cursor.execute("SELECT COUNT(*) FROM government_contacts WHERE email IS NOT NULL")
-        stats['contacts_with_email'] = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT state, COUNT(*) FROM government_contacts GROUP BY state ORDER BY COUNT(*) DESC LIMIT 10")
+        cursor.execute("SELECT state, contacts FROM contact_stats WHERE contacts > 0 ORDER BY contacts DESC LIMIT 10")
         stats['top_states'] = cursor.fetchall()
         
         conn.close()
@@ -302,26 +694,86 @@ class GovernmentContactScraper:
 
 def main():
     """Main execution function"""
-    scraper = GovernmentContactScraper()
+    parser = argparse.ArgumentParser(description="Government Contact Database Compiler")
+    parser.add_argument('--census-file', help="Ingest a saved Census API response instead of fetching it")
+    parser.add_argument('--leagues', help="JSON file mapping state to league directory URL")
+    parser.add_argument('--host-delay', type=float, default=2.0,
+                        help="Seconds between requests to the same host")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="Number of hosts crawled in parallel")
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the shared HTTP cache")
+    parser.add_argument('--parse-workers', type=int,
+                        help="HTML parsing processes (default: CPU count, 0 parses inline)")
+    parser.add_argument('--deadline', type=float,
+                        help="Stop cleanly after this many seconds, keeping the checkpoint")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore an unfinished run and start from scratch")
+    parser.add_argument('--export', default="government_contacts.csv",
+                        help="Export file (.csv or .jsonl, add .gz to compress)")
+    parser.add_argument('--since', action='store_true',
+                        help="Export only contacts changed since the previous export")
+    args = parser.parse_args()
+    deadline = Deadline(args.deadline)
+    
+    league_sources = load_league_sources(args.leagues) if args.leagues else None
+    scraper = GovernmentContactScraper(
+        league_sources=league_sources, host_delay=args.host_delay,
+        http_cache_path=None if args.no_cache else DEFAULT_CACHE_PATH,
+        parse_workers=args.parse_workers
+    )
+    checkpoints = CheckpointStore(scraper.db_path)
+    checkpoints.begin_stage('scrape', restart=args.restart)
+    done = checkpoints.done_items('scrape')
     
     print("🏛️  Government Contact Database Compiler")
     print("=" * 50)
     
     # Scrape Census data for municipality list
-    print("\n📊 Scraping Census data for municipalities...")
-    census_contacts = scraper.scrape_census_data()
-    for contact in census_contacts:
-        scraper.save_contact(contact)
+    census_failed = False
+    if 'census' in done:
+        print("\n📊 Census data already loaded in this run, skipping")
+    else:
+        print("\n📊 Scraping Census data for municipalities...")
+        checkpoints.mark_started('scrape', 'census')
+        try:
+            census_counts = scraper.ingest_census(args.census_file)
+        except Exception as e:
+            checkpoints.mark_failed('scrape', 'census', str(e))
+            census_failed = True
+            print(f"Census: failed ({e}); it will be retried on the next invocation")
+        else:
+            checkpoints.mark_done('scrape', 'census', census_counts)
+            print(f"Census: {census_counts['inserted']} inserted, {census_counts['updated']} updated, "
+                  f"{census_counts['unchanged']} unchanged, {census_counts['skipped']} skipped")
     
     # Scrape state municipal leagues
-    print("\n🏛️  Scraping state municipal league directories...")
-    league_contacts = scraper.scrape_state_municipal_leagues()
-    for contact in league_contacts:
-        scraper.save_contact(contact)
+    if deadline.expired():
+        print("\n⏱️  Deadline reached; league scrape will run on the next invocation")
+    elif 'leagues' in done:
+        print("\n🏛️  League directories already scraped in this run, skipping")
+    else:
+        print("\n🏛️  Scraping state municipal league directories...")
+        checkpoints.mark_started('scrape', 'leagues')
+        league_contacts = scraper.scrape_state_municipal_leagues(max_workers=args.workers)
+        scraper.parse_pool.close()
+        league_counts = scraper.save_contacts(league_contacts)
+        checkpoints.mark_done('scrape', 'leagues', league_counts)
+        print(f"Leagues: {league_counts['inserted']} inserted, {league_counts['updated']} updated, "
+              f"{league_counts['unchanged']} unchanged, {league_counts['skipped']} skipped")
+    
+    # A failed Census load keeps the run open so the next invocation resumes it
+    if not deadline.expired() and not census_failed:
+        checkpoints.finish_stage('scrape')
+    
+    # Merge rows that name the same town differently before enrichment
+    print("\n🧩 Resolving duplicate municipalities...")
+    resolution = resolve_municipalities(scraper.db_path)
+    print(f"Resolved {resolution['resolved']} contacts into {resolution['municipalities']} municipalities "
+          f"({resolution['merged']} merged)")
     
     # Export results
-    print("\n📄 Exporting to CSV...")
-    scraper.export_to_csv()
+    print("\n📄 Exporting contacts...")
+    scraper.export_to_csv(args.export, since=args.since)
     
     # Show statistics
     print("\n📈 Database Statistics:")
@@ -333,7 +785,7 @@ def main():
         print(f"  {state}: {count}")
     
     print(f"\n✅ Complete! Database saved to: government_contacts.db")
-    print(f"📄 CSV export saved to: government_contacts.csv")
+    print(f"📄 Export saved to: {args.export}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
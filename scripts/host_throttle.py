@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Per-Host Request Control
+Adapts politeness, concurrency and timeouts to each host's observed
+latency and errors, while letting requests to different hosts run in
+parallel
+"""
+
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+LATENCY_SAMPLES = 50  # Recent latencies kept per host for percentiles
+MIN_SAMPLES = 5  # Below this, callers' default timeouts are used
+ERROR_SMOOTHING = 0.1  # Weight of the newest outcome in the error rate
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+class HostState:
+    """Observed behaviour and current limits of one host"""
+
+    __slots__ = ('limit', 'in_flight', 'interval', 'floor', 'next_start', 'blocked_until',
+                 'latencies', 'error_rate', 'requests')
+
+    def __init__(self, interval: float, floor: float):
+        self.limit = 1.0  # Concurrent requests allowed (AIMD)
+        self.in_flight = 0
+        self.interval = interval  # Seconds between request starts
+        self.floor = floor  # Lowest interval this host is allowed
+        self.next_start = 0.0
+        self.blocked_until = 0.0  # Set from Retry-After
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.error_rate = 0.0
+        self.requests = 0
+
+
+class HostSlot:
+    """One admitted request; use as a context manager around the fetch
+
+    ``timeout`` is the timeout to pass to requests. Call ``record()`` with
+    the response; a Timeout or ConnectionError raised inside the block is
+    recorded as a failure automatically.
+    """
+
+    def __init__(self, controller: 'HostController', host: str, default_timeout: float):
+        self.controller = controller
+        self.host = host
+        self.timeout = default_timeout
+        self.started = None
+        self.recorded = False
+
+    def __enter__(self) -> 'HostSlot':
+        self.timeout = self.controller.acquire(self.host, self.timeout)
+        self.started = time.monotonic()
+        return self
+
+    def record(self, response: requests.Response):
+        if self.recorded:
+            return
+        self.recorded = True
+        if getattr(response, 'from_cache', False):
+            self.controller.release(self.host)
+            return
+        failed = response.status_code == 429 or response.status_code >= 500
+        self.controller.release(
+            self.host, time.monotonic() - self.started, failed,
+            parse_retry_after(response.headers.get('Retry-After'))
+        )
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.recorded:
+            return False
+        self.recorded = True
+        if exc_type is not None and issubclass(exc_type, (requests.Timeout, requests.ConnectionError)):
+            self.controller.release(self.host, time.monotonic() - self.started, True)
+        elif exc_type is not None:
+            self.controller.release(self.host)
+        else:
+            self.controller.release(self.host, time.monotonic() - self.started, False)
+        return False
+
+
+class HostController:
+    """Thread-safe per-host politeness, concurrency and timeout control
+
+    Each host starts at one request at a time, ``delay`` seconds apart.
+    Successes raise its concurrency additively (up to max_concurrency) and
+    move the interval toward its median latency, never below ``min_delay``
+    or the host's entry in ``overrides``. Timeouts, connection errors, 429s
+    and 5xx halve the concurrency and double the interval; Retry-After
+    pauses the host outright. Timeouts are derived from the p99 latency once
+    a host has enough samples.
+    """
+
+    def __init__(self, delay: float = 2.0, overrides: Optional[Dict[str, float]] = None,
+                 min_delay: float = 0.25, max_delay: float = 30.0, max_concurrency: int = 4,
+                 min_timeout: float = 3.0, max_timeout: float = 60.0, timeout_factor: float = 3.0):
+        self.delay = delay
+        self.overrides = {host.lower(): value for host, value in (overrides or {}).items()}
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_concurrency = max_concurrency
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+        self._cond = threading.Condition()
+        self._hosts: Dict[str, HostState] = {}
+
+    def request(self, url: str, timeout: float = 30.0) -> HostSlot:
+        """Slot for a request to the URL's host; timeout is used until latencies are known"""
+        return HostSlot(self, urlparse(url).netloc.lower(), timeout)
+
+    def _state(self, host: str) -> HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            floor = self.overrides.get(host, self.min_delay)
+            state = self._hosts[host] = HostState(max(self.delay, floor), floor)
+        return state
+
+    def acquire(self, host: str, default_timeout: float) -> float:
+        """Wait for a free slot on the host and return the timeout to use"""
+        with self._cond:
+            state = self._state(host)
+            while True:
+                now = time.monotonic()
+                start_at = max(state.next_start, state.blocked_until)
+                if state.in_flight < int(state.limit) and now >= start_at:
+                    break
+                self._cond.wait(start_at - now if now < start_at else None)
+            state.in_flight += 1
+            state.requests += 1
+            state.next_start = now + state.interval
+            return self._timeout(state, default_timeout)
+
+    def release(self, host: str, latency: Optional[float] = None, failed: bool = False,
+                retry_after: Optional[float] = None):
+        """Finish a request, updating the host's limits from its outcome"""
+        with self._cond:
+            state = self._state(host)
+            state.in_flight = max(state.in_flight - 1, 0)
+
+            if latency is not None:
+                state.error_rate += ERROR_SMOOTHING * ((1.0 if failed else 0.0) - state.error_rate)
+                if failed:
+                    state.limit = max(state.limit / 2, 1.0)
+                    state.interval = min(max(state.interval * 2, state.floor), self.max_delay)
+                else:
+                    state.latencies.append(latency)
+                    state.limit = min(state.limit + 1 / state.limit, float(self.max_concurrency))
+                    median = percentile(state.latencies, 0.5)
+                    state.interval = max((state.interval + median) / 2, state.floor)
+
+            if retry_after:
+                state.blocked_until = max(state.blocked_until, time.monotonic() + retry_after)
+
+            self._cond.notify_all()
+
+    def _timeout(self, state: HostState, default_timeout: float) -> float:
+        if len(state.latencies) < MIN_SAMPLES:
+            return default_timeout
+        p99 = percentile(state.latencies, 0.99)
+        return min(max(p99 * self.timeout_factor, self.min_timeout), self.max_timeout)
+
+    def state(self) -> Dict[str, Dict]:
+        """Snapshot of every host's limits and latency statistics"""
+        with self._cond:
+            now = time.monotonic()
+            return {
+                host: {
+                    'concurrency': int(state.limit),
+                    'in_flight': state.in_flight,
+                    'interval': round(state.interval, 3),
+                    'p50': percentile(state.latencies, 0.5),
+                    'p99': percentile(state.latencies, 0.99),
+                    'timeout': self._timeout(state, None),
+                    'error_rate': round(state.error_rate, 3),
+                    'blocked_for': round(max(state.blocked_until - now, 0), 1),
+                    'requests': state.requests,
+                }
+                for host, state in self._hosts.items()
+            }
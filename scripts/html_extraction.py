@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+HTML Extraction
+BeautifulSoup parsing and extraction shared by the scraper, enricher and
+qualifier. The *_page functions take raw response bytes and return small,
+picklable results so they can run in a ParsePool worker process, away from
+the threads doing network I/O.
+"""
+
+import os
+import re
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+from bs4 import BeautifulSoup
+
+from cms_fingerprint import DEFAULT_RULES_PATH, load_engine
+from http_cache import normalize_url
+
+# Common patterns for municipal directories: entry containers, then the
+# selectors tried for each field inside an entry
+DIRECTORY_CONTAINER_SELECTORS = [
+    '.city-listing', '.municipality', '.member-listing',
+    '.directory-entry', '.contact-card', '.official-listing'
+]
+
+DIRECTORY_FIELD_SELECTORS = {
+    'municipality': ['h1', 'h2', 'h3', '.city-name', '.municipality-name'],
+    'contact_name': ['.contact-name', '.official-name', '.name'],
+    'title': ['.title', '.position', '.role'],
+    'address': ['.address', '.location'],
+}
+
+# Contact page link keywords by strength, matched in the URL path and link text
+CONTACT_LINK_KEYWORDS = {
+    'clerk': 10, 'staff-directory': 9, 'directory': 8, 'contact': 7, 'staff': 7,
+    'city-manager': 6, 'mayor': 5, 'council': 4, 'departments': 3, 'phone': 2, 'email': 2,
+}
+
+ENTRY_EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+ENTRY_PHONE_PATTERN = re.compile(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b')
+
+# Official titles recognised on contact pages, longest first
+OFFICIAL_TITLES = ('City Manager', 'City Clerk', 'Town Clerk', 'Administrator', 'Mayor')
+
+# Local-part words that mark an address as an official municipal mailbox
+GOV_EMAIL_ROLES = ('clerk', 'mayor', 'manager', 'admin', 'city', 'town')
+
+# One alternation for every token extract_contact_text looks for. The email
+# lookbehind only starts a match at the beginning of an address, so a long
+# run of address characters is scanned once rather than from every offset.
+CONTACT_TEXT_PATTERN = re.compile(
+    r'(?P<email>(?<![A-Za-z0-9._%+-])[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b)'
+    r'|(?P<phone>\(\d{3}\)\s?\d{3}[-.\s]?\d{4}|\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b)'
+    r'|(?P<title>\b(?:' + '|'.join(re.escape(title) for title in OFFICIAL_TITLES) + r')\b)',
+    re.IGNORECASE
+)
+
+# Up to four capitalised words on one line, e.g. "Jane Q. Doe"
+OFFICIAL_NAME = r"[A-Z][A-Za-z.'-]*(?:[ \t]+[A-Z][A-Za-z.'-]*){0,3}"
+NAME_AFTER_TITLE = re.compile(r'[ \t]*:\s*(' + OFFICIAL_NAME + ')')
+NAME_BEFORE_TITLE = re.compile('(' + OFFICIAL_NAME + r'),[ \t]*$')
+NAME_WINDOW = 60  # Characters searched before a title for "Name, Title"
+
+
+class ParsePool:
+    """Process pool for CPU-bound parsing; workers=0 parses inline"""
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self._executor = None
+
+    def submit(self, fn, *args) -> Future:
+        if self.workers <= 0:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor.submit(fn, *args)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def make_soup(html: bytes) -> BeautifulSoup:
+    return BeautifulSoup(html, 'html.parser')
+
+
+# Directory pages (GovernmentContactScraper)
+
+def match_text(element, selectors: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Return (text, selector) for the first selector with text, or (None, None)"""
+    for selector in selectors:
+        found = element.select_one(selector)
+        if found:
+            text = found.get_text(strip=True)
+            if text:
+                return text, selector
+    return None, None
+
+
+def extract_entry_email(element) -> Optional[str]:
+    """Extract email address from element"""
+    match = ENTRY_EMAIL_PATTERN.search(element.get_text())
+    return match.group() if match else None
+
+
+def extract_entry_phone(element) -> Optional[str]:
+    """Extract phone number from element"""
+    match = ENTRY_PHONE_PATTERN.search(element.get_text())
+    return match.group() if match else None
+
+
+def extract_entry_website(element) -> Optional[str]:
+    """Extract website URL from element"""
+    links = element.find_all('a', href=True)
+    for link in links:
+        href = link['href']
+        if href.startswith('http') and any(domain in href for domain in ['.gov', '.org', '.com']):
+            return href
+    return None
+
+
+def parse_directory_entry(entry, field_selectors: Optional[Dict[str, List[str]]] = None,
+                          matched: Optional[Dict[str, Dict[str, int]]] = None) -> Optional[Dict]:
+    """Parse individual directory entry into a dict of contact fields
+
+    field_selectors overrides DIRECTORY_FIELD_SELECTORS; matched, if given,
+    collects per-field hit counts of the selectors that found text.
+    """
+    selectors = field_selectors or DIRECTORY_FIELD_SELECTORS
+
+    def field_text(field: str) -> Optional[str]:
+        text, selector = match_text(entry, selectors.get(field, []))
+        if selector and matched is not None:
+            matched[field][selector] = matched[field].get(selector, 0) + 1
+        return text
+
+    # Extract municipality name
+    municipality = field_text('municipality')
+    if not municipality:
+        return None
+
+    return {
+        'municipality': municipality,
+        'contact_name': field_text('contact_name'),
+        'title': field_text('title'),
+        'email': extract_entry_email(entry),
+        'phone': extract_entry_phone(entry),
+        'website': extract_entry_website(entry),
+        'address': field_text('address'),
+    }
+
+
+def extract_directory(soup: BeautifulSoup, profile: Optional[Dict] = None) -> Tuple[List[Dict], Optional[Dict]]:
+    """Extract directory entries, returning (entries, newly learned profile)
+
+    A known profile is tried first; every container selector is probed only
+    when there is no profile or it no longer yields entries.
+    """
+    if profile:
+        entries = [
+            entry for entry in
+            (parse_directory_entry(element, profile['fields']) for element in soup.select(profile['container']))
+            if entry
+        ]
+        if entries:
+            return entries, None
+
+    matched = {field: {} for field in DIRECTORY_FIELD_SELECTORS}
+    for selector in DIRECTORY_CONTAINER_SELECTORS:
+        elements = soup.select(selector)
+        if elements:
+            entries = [entry for entry in (parse_directory_entry(e, matched=matched) for e in elements) if entry]
+            if not entries:
+                break
+            learned = {
+                'container': selector,
+                # Most frequent first; fields that never matched are skipped next time
+                'fields': {field: sorted(hits, key=hits.get, reverse=True) for field, hits in matched.items()},
+            }
+            return entries, learned
+    return [], None
+
+
+def extract_directory_page(html: bytes, profile: Optional[Dict] = None) -> Tuple[List[Dict], Optional[Dict]]:
+    """Pool worker: parse a directory page"""
+    return extract_directory(make_soup(html), profile)
+
+
+# Municipality pages (ContactEnricher)
+
+def contact_link_score(url: str, text: str) -> float:
+    """Priority of a link as a contact page; 0 if it does not look like one
+
+    The strongest keyword in the path or the link text counts, with a bonus
+    when both match and a penalty for every level of path depth.
+    """
+    path = urlsplit(url).path.lower()
+    text = text.lower()
+    path_weight = max((weight for keyword, weight in CONTACT_LINK_KEYWORDS.items() if keyword in path), default=0)
+    text_weight = max((weight for keyword, weight in CONTACT_LINK_KEYWORDS.items() if keyword in text), default=0)
+    if not path_weight and not text_weight:
+        return 0
+    depth = len([segment for segment in path.split('/') if segment])
+    return max(path_weight, text_weight) + (2 if path_weight and text_weight else 0) - 0.5 * depth
+
+
+def same_site(url: str, site_host: str) -> bool:
+    """True when url is on site_host or one of its subdomains (ignoring www.)"""
+    host = (urlsplit(url).hostname or '').lower().removeprefix('www.')
+    site_host = site_host.lower().removeprefix('www.')
+    return host == site_host or host.endswith('.' + site_host)
+
+
+def rank_contact_links(soup: BeautifulSoup, base_url: str) -> List[Tuple[float, str]]:
+    """Same-site contact page links as (score, url), best first and deduped
+
+    Fragments are dropped and mailto:, tel: and javascript: links skipped.
+    """
+    site_host = urlsplit(base_url).hostname or ''
+    base_key = normalize_url(base_url)
+    best: Dict[str, Tuple[float, str]] = {}
+
+    for link in soup.find_all('a', href=True):
+        url = urldefrag(urljoin(base_url, link['href'].strip()))[0]
+        if urlsplit(url).scheme not in ('http', 'https') or not same_site(url, site_host):
+            continue
+        score = contact_link_score(url, link.get_text())
+        key = normalize_url(url)
+        if score <= 0 or key == base_key:
+            continue
+        if key not in best or score > best[key][0]:
+            best[key] = (score, url)
+
+    return sorted(best.values(), key=lambda pair: -pair[0])
+
+
+def find_contact_links(soup: BeautifulSoup, base_url: str) -> List[str]:
+    """Find contact and staff pages on the website, most promising first"""
+    return [url for _, url in rank_contact_links(soup, base_url)]
+
+
+def extract_contact_text(text: str) -> Dict[str, List]:
+    """Emails, phones and officials from page text in a single scan
+
+    CONTACT_TEXT_PATTERN finds all three kinds of token in one pass; names
+    are only looked for next to a title, inside a bounded window, so the
+    cost stays linear in the page length.
+    """
+    emails, phones, officials = [], [], []
+
+    for match in CONTACT_TEXT_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == 'email':
+            email = match.group()
+            lowered = email.lower()
+            # Filter for relevant government emails
+            if any(domain in lowered for domain in ('.gov', '.org')) and \
+               any(role in lowered for role in GOV_EMAIL_ROLES):
+                emails.append(email)
+        elif kind == 'phone':
+            phones.append(match.group())
+        else:
+            title = match.group()
+            # "Mayor: Jane Doe", else "Jane Doe, Mayor"
+            name = NAME_AFTER_TITLE.match(text, match.end())
+            if not name:
+                name = NAME_BEFORE_TITLE.search(text, max(match.start() - NAME_WINDOW, 0), match.start())
+            if name:
+                officials.append({'name': name.group(1).strip(), 'title': title})
+
+    return {'emails': emails, 'phones': phones, 'officials': officials}
+
+
+def page_text(soup: BeautifulSoup) -> str:
+    """Page text with element boundaries kept as line breaks"""
+    return soup.get_text('\n')
+
+
+def extract_emails(soup: BeautifulSoup) -> List[str]:
+    """Extract email addresses from page"""
+    return extract_contact_text(page_text(soup))['emails']
+
+
+def extract_phones(soup: BeautifulSoup) -> List[str]:
+    """Extract phone numbers from page"""
+    return extract_contact_text(page_text(soup))['phones']
+
+
+def extract_officials(soup: BeautifulSoup) -> List[Dict]:
+    """Extract official names and titles from page"""
+    return extract_contact_text(page_text(soup))['officials']
+
+
+def find_contact_links_page(html: bytes, base_url: str) -> List[Tuple[float, str]]:
+    """Pool worker: ranked contact page links from a homepage"""
+    return rank_contact_links(make_soup(html), base_url)
+
+
+def extract_contact_page(html: bytes, base_url: Optional[str] = None) -> Dict[str, List]:
+    """Pool worker: emails, phones and officials from a contact page
+
+    With base_url, also returns the page's own ranked contact 'links'.
+    """
+    soup = make_soup(html)
+    page = extract_contact_text(page_text(soup))
+    if base_url:
+        page['links'] = rank_contact_links(soup, base_url)
+    return page
+
+
+# Homepage technology analysis (LeadQualifier)
+
+def detect_cms(soup: BeautifulSoup, html_content: str, headers: Optional[Dict[str, str]],
+               cms_rules_path: str = DEFAULT_RULES_PATH, urls: Tuple[str, ...] = ()) -> Dict:
+    """cms, cms_confidence, cms_version and cms_category for a parsed page
+
+    The generator tag and script/stylesheet URLs come from soup; urls adds
+    others, such as the page's own URL after redirects.
+    """
+    generator = soup.find('meta', attrs={'name': 'generator'})
+    urls = list(urls) + [tag['src'] for tag in soup.find_all('script', src=True)]
+    urls += [tag['href'] for tag in soup.find_all('link', href=True)]
+    cms = load_engine(cms_rules_path).detect(
+        html_content, headers, generator.get('content') if generator else None, urls
+    )
+    return {
+        'cms': cms['cms'] or 'Unknown',
+        'cms_confidence': cms['confidence'],
+        'cms_version': cms['version'],
+        'cms_category': cms['category'],
+    }
+
+
+def prescreen_page(html: bytes, encoding: Optional[str], headers: Optional[Dict[str, str]],
+                   url: str, cms_rules_path: str = DEFAULT_RULES_PATH) -> Dict:
+    """Pool worker: CMS and viewport checks from the headers and first few KB of a page
+
+    The URL reached after redirects counts as an asset URL, so a site
+    hosted on a vendor's domain is recognised from the redirect alone.
+    """
+    soup = make_soup(html)
+    html_content = html.decode(encoding or 'utf-8', errors='replace').lower()
+    analysis = detect_cms(soup, html_content, headers, cms_rules_path, (url,))
+    analysis['has_mobile_responsive'] = soup.find('meta', attrs={'name': 'viewport'}) is not None
+    return analysis
+
+
+def analyze_page(html: bytes, encoding: Optional[str] = None, headers: Optional[Dict[str, str]] = None,
+                 cms_rules_path: str = DEFAULT_RULES_PATH) -> Dict:
+    """Pool worker: CMS, outdated markup, viewport and accessibility checks
+
+    headers are the response headers, used for CMS fingerprinting. Returns
+    the partial analysis plus 'links', the first 50 hrefs for the caller's
+    broken-link check, which needs the network.
+    """
+    soup = make_soup(html)
+    html_content = html.decode(encoding or 'utf-8', errors='replace').lower()
+
+    # Detect CMS from headers, cookies, generator tag, asset URLs and markup
+    analysis = detect_cms(soup, html_content, headers, cms_rules_path)
+
+    # Check for outdated indicators
+    outdated_indicators = [
+        'table-based layout',
+        'flash',
+        'internet explorer',
+        '<font',
+        'bgcolor='
+    ]
+
+    analysis['is_outdated'] = any(indicator in html_content for indicator in outdated_indicators)
+
+    # Check mobile responsiveness
+    viewport_tag = soup.find('meta', attrs={'name': 'viewport'})
+    analysis['has_mobile_responsive'] = viewport_tag is not None
+
+    # Check for accessibility issues
+    accessibility_checks = [
+        len(soup.find_all('img', alt=False)) > 0,  # Images without alt text
+        len(soup.find_all('a', title=False)) > 5,  # Links without titles
+        not soup.find('h1')  # No main heading
+    ]
+
+    analysis['accessibility_issues'] = any(accessibility_checks)
+
+    # Check for "under construction" or maintenance messages
+    analysis['under_construction'] = any(
+        phrase in html_content for phrase in ['under construction', 'coming soon', 'maintenance']
+    )
+
+    # The checker samples the first checkable ones, skipping anchors and mailto:
+    analysis['links'] = [link['href'] for link in soup.find_all('a', href=True, limit=50)]
+
+    return analysis
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP Response Cache
+On-disk cache for GET responses shared by every script in the pipeline.
+Bodies are stored zlib-compressed in SQLite, keyed by normalized URL, and
+stale entries are revalidated with If-None-Match / If-Modified-Since.
+Entries flagged partial hold only the start of a body (see bounded_fetch)
+and are never served as a complete response.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "http_cache.db"
+
+# Headers not kept with a cached body: hop-by-hop and encoding headers,
+# because the stored body is already decoded. Everything else is kept for
+# header-based checks such as CMS fingerprinting.
+DROPPED_HEADERS = {
+    'connection', 'keep-alive', 'transfer-encoding', 'content-encoding',
+    'content-length', 'date', 'age', 'proxy-authenticate', 'trailer', 'upgrade'
+}
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL into a cache key"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        host = f"{host}:{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+class HTTPCache:
+    """SQLite-backed response store with age and size based eviction"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = 24 * 3600,
+                 max_age: float = 30 * 24 * 3600, max_bytes: int = 512 * 1024 * 1024,
+                 max_entry_bytes: int = 10 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl  # Served without revalidation while younger than this
+        self.max_age = max_age  # Evicted once older than this
+        self.max_bytes = max_bytes  # Total compressed size budget
+        self.max_entry_bytes = max_entry_bytes  # Larger bodies are not stored
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS http_cache (
+                url_key TEXT PRIMARY KEY,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                size INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL,
+                last_access REAL,
+                partial INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(http_cache)")}
+        if 'partial' not in columns:
+            self._conn.execute("ALTER TABLE http_cache ADD COLUMN partial INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_http_cache_access ON http_cache (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Return the cached entry for a URL, or None"""
+        key = normalize_url(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, etag, last_modified, stored_at, partial FROM http_cache "
+                "WHERE url_key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[5] > self.max_age:
+                self._conn.execute("DELETE FROM http_cache WHERE url_key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE http_cache SET last_access = ? WHERE url_key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return {
+            'status': row[0],
+            'headers': json.loads(row[1]),
+            'body': zlib.decompress(row[2]),
+            'etag': row[3],
+            'last_modified': row[4],
+            'stored_at': row[5],
+            'partial': bool(row[6]),
+        }
+
+    def is_fresh(self, entry: Dict) -> bool:
+        return time.time() - entry['stored_at'] < self.ttl
+
+    def store(self, url: str, status: int, headers: Dict[str, str], body: bytes, partial: bool = False):
+        """Store a response body (or, if partial, its first bytes) and its validators"""
+        if len(body) > self.max_entry_bytes:
+            return
+        compressed = zlib.compress(body, 6)
+        now = time.time()
+        kept = {name: value for name, value in headers.items() if name.lower() not in DROPPED_HEADERS}
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO http_cache
+                (url_key, status, headers, body, size, etag, last_modified, stored_at, last_access, partial)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                normalize_url(url), status, json.dumps(kept), compressed, len(compressed),
+                headers.get('ETag'), headers.get('Last-Modified'), now, now, int(partial)
+            ))
+            self._conn.commit()
+        self.evict()
+
+    def touch(self, url: str):
+        """Mark an entry as freshly validated (after a 304)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE http_cache SET stored_at = ?, last_access = ? WHERE url_key = ?",
+                (now, now, normalize_url(url))
+            )
+            self._conn.commit()
+
+    def evict(self):
+        """Drop entries past max_age, then least recently used ones over max_bytes"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM http_cache WHERE stored_at < ?", (time.time() - self.max_age,)
+            )
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                victims = []
+                for key, size in self._conn.execute(
+                        "SELECT url_key, size FROM http_cache ORDER BY last_access"):
+                    victims.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                self._conn.executemany("DELETE FROM http_cache WHERE url_key = ?", victims)
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM http_cache"
+            ).fetchone()
+        return {'entries': entries, 'bytes': size}
+
+
+class CachingAdapter(HTTPAdapter):
+    """Transport adapter that answers GETs from an HTTPCache"""
+
+    def __init__(self, cache: HTTPCache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def build_cached_response(self, request, entry: Dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = entry['body']
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK'
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.from_cache = True
+        return response
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+
+        entry = self.cache.get(request.url)
+        if entry and entry['partial']:
+            # Only prefix reads may use it; fetch_page handles those itself
+            entry = None
+        if entry and self.cache.is_fresh(entry):
+            return self.build_cached_response(request, entry)
+
+        if entry:
+            if entry['etag']:
+                request.headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request.headers['If-Modified-Since'] = entry['last_modified']
+
+        response = super().send(request, **kwargs)
+
+        if entry and response.status_code == 304:
+            response.close()
+            self.cache.touch(request.url)
+            return self.build_cached_response(request, entry)
+
+        # Streamed bodies are left to the caller, who may stop reading early
+        cache_control = response.headers.get('Cache-Control', '').lower()
+        if response.status_code == 200 and 'no-store' not in cache_control and not kwargs.get('stream'):
+            length = response.headers.get('Content-Length')
+            if length is None or (length.isdigit() and int(length) <= self.cache.max_entry_bytes):
+                self.cache.store(request.url, response.status_code, response.headers, response.content)
+
+        response.from_cache = False
+        return response
+
+
+def install_cache(session: requests.Session, cache: Optional[HTTPCache] = None,
+                  path: str = DEFAULT_CACHE_PATH) -> HTTPCache:
+    """Mount a caching adapter on a session for http:// and https://"""
+    cache = cache or HTTPCache(path)
+    adapter = CachingAdapter(cache)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return cache
@@ -8,15 +8,68 @@ import sqlite3
 import requests
 import logging
 from typing import Dict, List, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 import json
-from urllib.parse import urlparse
-from bs4 import BeautifulSoup
-import re
+import os
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from http_cache import DEFAULT_CACHE_PATH, install_cache
+from bounded_fetch import DEFAULT_MAX_BYTES, fetch_page
+from link_checker import LinkChecker, LinkStatusStore
+from host_throttle import HostController
+from pipeline_checkpoints import CheckpointStore, Deadline
+from work_queue import WorkQueue, drain
+from delta_export import export_rows
+from schema_migrations import migrate_contacts, migrate_leads, table_exists
+from municipality_resolution import init_resolution_schema
+from html_extraction import ParsePool, analyze_page, prescreen_page
+from cms_fingerprint import DEFAULT_RULES_PATH
+from lead_scoring import LeadBatch
+from website_snapshots import SnapshotStore, page_fingerprint
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Bytes read for the pre-screen tier: headers plus the page's <head>
+PRESCREEN_BYTES = 16 * 1024
+
+# Fingerprint confidence needed to settle a site as a vendor customer from
+# the pre-screen alone (more than page text mentioning the vendor)
+PRESCREEN_CONFIDENCE = 0.6
+
+# Saves one lead per contact; an unchanged lead is not rewritten
+LEAD_UPSERT = """
+    INSERT INTO qualified_leads
+    (contact_id, municipality, state, score, priority, reasons, next_steps, website_analysis, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (contact_id) DO UPDATE SET
+        municipality = excluded.municipality, state = excluded.state,
+        score = excluded.score, priority = excluded.priority,
+        reasons = excluded.reasons, next_steps = excluded.next_steps,
+        website_analysis = excluded.website_analysis, updated_at = excluded.updated_at
+    WHERE score IS NOT excluded.score OR priority IS NOT excluded.priority
+        OR reasons IS NOT excluded.reasons OR next_steps IS NOT excluded.next_steps
+        OR website_analysis IS NOT excluded.website_analysis
+        OR municipality IS NOT excluded.municipality OR state IS NOT excluded.state
+"""
+
+# Queued leads finished longer ago than this are queued again (weekly re-qualification)
+REQUEUE_AFTER = 6 * 24 * 3600
+
+# Contact columns read for qualification, in query order
+CONTACT_FIELDS = ('id', 'municipality', 'state', 'population', 'email', 'website', 'contact_name', 'title')
+
+# Contacts worth qualifying: with a website, in the target population range,
+# and the canonical row of their municipality
+QUALIFY_CANDIDATES = """
+    website IS NOT NULL AND population > 500 AND population < 50000
+    AND (gc.municipality_id IS NULL OR gc.id = (
+        SELECT canonical_contact_id FROM municipalities m WHERE m.id = gc.municipality_id
+    ))
+"""
+
 @dataclass
 class LeadScore:
     """Lead scoring data structure"""
@@ -32,17 +85,51 @@ class LeadScore:
 class LeadQualifier:
     """Analyzes and scores government contacts as potential leads"""
     
-    def __init__(self, db_path: str = "government_contacts.db"):
+    def __init__(self, db_path: str = "government_contacts.db",
+                 http_cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                 parse_workers: Optional[int] = None, max_page_bytes: int = DEFAULT_MAX_BYTES,
+                 cms_rules_path: str = DEFAULT_RULES_PATH, prescreen: bool = True,
+                 reuse_snapshots: bool = True):
         self.db_path = db_path
+        self.max_page_bytes = max_page_bytes
+        self.cms_rules_path = cms_rules_path
+        self.prescreen = prescreen
+        self.reuse_snapshots = reuse_snapshots
+        self.parse_pool = ParsePool(parse_workers)
+        # Starts gentle and settles at each site's own pace
+        self.hosts = HostController(delay=0.5, min_delay=0)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        if http_cache_path:
+            install_cache(self.session, path=http_cache_path)
+        self.checkpoints = CheckpointStore(db_path)
+        self.snapshots = SnapshotStore(db_path)
+        self.link_checker = LinkChecker(self.session, LinkStatusStore(db_path), self.hosts)
+        self.init_database()
+    
+    def init_database(self):
+        """Create the qualified_leads table, indexes and stats tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        if table_exists(cursor, 'government_contacts'):
+            migrate_contacts(cursor)
+            init_resolution_schema(cursor)
+        migrate_leads(cursor)
+        
+        conn.commit()
+        conn.close()
     
     def analyze_website_technology(self, website: str) -> Dict:
         """Analyze what technology a municipality website is using"""
         analysis = {
             'cms': 'Unknown',
+            'cms_confidence': 0.0,
+            'cms_version': None,
+            'cms_category': None,
+            'analysis_tier': 'full',
             'is_outdated': False,
             'has_mobile_responsive': False,
             'load_speed_issues': False,
@@ -51,75 +138,84 @@ class LeadQualifier:
             'technology_stack': []
         }
         
+        screened = {}
+        prefix = {}
+        prefix_snapshot = self.snapshots.latest(website, partial=True) if self.prescreen else None
+        
+        def screen(partial) -> bool:
+            # Cheap tier: locked-in vendor customers are settled from the
+            # headers and first few KB, and the rest of the page is never read.
+            # A prefix unchanged since it last settled the site is not
+            # fingerprinted again.
+            prefix['fingerprint'] = self.parse_pool.submit(
+                page_fingerprint, partial.content, partial.encoding
+            ).result()
+            prefix['reused'] = (self.reuse_snapshots
+                                and self.snapshots.unchanged(prefix_snapshot, *prefix['fingerprint'])
+                                and self.is_locked_in(prefix_snapshot['analysis']))
+            if prefix['reused']:
+                screened.update(prefix_snapshot['analysis'])
+                return True
+            screened.update(self.parse_pool.submit(
+                prescreen_page, partial.content, partial.encoding, dict(partial.headers),
+                partial.url, self.cms_rules_path
+            ).result())
+            return self.is_locked_in(screened)
+        
         try:
-            response = self.session.get(website, timeout=30)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            html_content = response.text.lower()
-            
-            # Detect CMS
-            cms_indicators = {
-                'wordpress': ['wp-content', 'wp-includes', 'wordpress'],
-                'drupal': ['drupal', 'sites/default', 'misc/drupal'],
-                'joomla': ['joomla', 'templates/system'],
-                'squarespace': ['squarespace'],
-                'wix': ['wix.com', 'wixstatic'],
-                'civicplus': ['civicplus', 'civic-plus'],
-                'granicus': ['granicus'],
-                'revize': ['revize'],
-                'vision': ['visioninternet']
-            }
-            
-            for cms, indicators in cms_indicators.items():
-                if any(indicator in html_content for indicator in indicators):
-                    analysis['cms'] = cms
-                    break
+            with self.hosts.request(website, timeout=30) as slot:
+                response = fetch_page(
+                    self.session, website, timeout=slot.timeout, max_bytes=self.max_page_bytes,
+                    prefix_bytes=PRESCREEN_BYTES if self.prescreen else None,
+                    screen=screen if self.prescreen else None
+                )
+                slot.record(response)
             
-            # Check for outdated indicators
-            outdated_indicators = [
-                'table-based layout',
-                'flash',
-                'internet explorer',
-                '<font',
-                'bgcolor='
-            ]
+            if self.is_locked_in(screened):
+                logger.info(f"{website}: {screened['cms']} customer, skipping full analysis")
+                analysis.update(screened)
+                if prefix['reused']:
+                    self.snapshots.touch(prefix_snapshot['id'])
+                    analysis['analysis_tier'] = 'snapshot'
+                    return analysis
+                analysis['analysis_tier'] = 'prescreen'
+                self.snapshots.record(website, *prefix['fingerprint'], analysis, prefix_snapshot, partial=True)
+                return analysis
             
-            analysis['is_outdated'] = any(indicator in html_content for indicator in outdated_indicators)
+            # An unchanged page keeps its last analysis
+            content_hash, simhash = self.parse_pool.submit(
+                page_fingerprint, response.content, response.encoding
+            ).result()
+            previous = self.snapshots.latest(website)
+            if self.reuse_snapshots and self.snapshots.unchanged(previous, content_hash, simhash):
+                self.snapshots.touch(previous['id'])
+                analysis.update(previous['analysis'])
+                analysis['analysis_tier'] = 'snapshot'
+                return analysis
             
-            # Check mobile responsiveness
-            viewport_tag = soup.find('meta', attrs={'name': 'viewport'})
-            analysis['has_mobile_responsive'] = viewport_tag is not None
-            
-            # Check for accessibility issues
-            accessibility_checks = [
-                len(soup.find_all('img', alt=False)) > 0,  # Images without alt text
-                len(soup.find_all('a', title=False)) > 5,  # Links without titles
-                not soup.find('h1')  # No main heading
-            ]
-            
-            analysis['accessibility_issues'] = any(accessibility_checks)
+            # Parse off-thread; only the broken-link check below needs the network
+            page = self.parse_pool.submit(
+                analyze_page, response.content, response.encoding, dict(response.headers), self.cms_rules_path
+            ).result()
+            links = page.pop('links')
+            under_construction = page.pop('under_construction')
+            analysis.update(page)
             
             # Content management red flags
             content_issues = []
             
             # Check for "under construction" or maintenance messages
-            if any(phrase in html_content for phrase in ['under construction', 'coming soon', 'maintenance']):
+            if under_construction:
                 content_issues.append('Site under construction/maintenance')
             
-            # Check for broken links (sample check)
-            links = soup.find_all('a', href=True)[:10]  # Check first 10 links
-            broken_links = 0
-            for link in links:
-                try:
-                    link_response = self.session.head(link['href'], timeout=5)
-                    if link_response.status_code >= 400:
-                        broken_links += 1
-                except:
-                    broken_links += 1
+            # Check for broken links (sample check, within the per-site budget)
+            broken_links, _ = self.link_checker.count_broken(response.url, links)
             
             if broken_links > 2:
                 content_issues.append('Multiple broken links detected')
             
             analysis['content_management_issues'] = content_issues
+            self.snapshots.record(website, content_hash, simhash, analysis, previous)
             
         except Exception as e:
             logger.error(f"Error analyzing website {website}: {e}")
@@ -127,117 +223,38 @@ class LeadQualifier:
         
         return analysis
     
+    @staticmethod
+    def is_locked_in(analysis: Dict) -> bool:
+        """Whether an analysis confidently identifies a government CMS vendor"""
+        return (analysis.get('cms_category') == 'government'
+                and analysis.get('cms_confidence', 0) >= PRESCREEN_CONFIDENCE)
+    
     def calculate_lead_score(self, contact: Dict, website_analysis: Dict) -> LeadScore:
-        """Calculate lead score based on various factors"""
-        score = 0.0
-        reasons = []
-        next_steps = []
-        
-        municipality = contact['municipality']
-        state = contact['state']
-        population = contact.get('population', 0)
-        website = contact.get('website')
-        email = contact.get('email')
-        
-        # Population scoring (sweet spot: 1,000 - 25,000)
-        if 1000 <= population <= 25000:
-            score += 25
-            reasons.append(f"Ideal population size ({population:,})")
-        elif 500 <= population < 1000:
-            score += 15
-            reasons.append(f"Small but viable population ({population:,})")
-        elif population > 25000:
-            score += 5
-            reasons.append(f"Larger municipality ({population:,}) - may have existing solutions")
-        else:
-            score -= 10
-            reasons.append(f"Very small population ({population:,}) - limited budget")
-        
-        # Technology analysis scoring
-        if website_analysis['cms'] == 'Unknown' or website_analysis['cms'] == 'Error':
-            score += 20
-            reasons.append("No modern CMS detected - high potential need")
-            next_steps.append("Offer free website audit")
-        
-        elif website_analysis['cms'] in ['wordpress', 'joomla']:
-            score += 15
-            reasons.append(f"Using {website_analysis['cms']} - not government-specific")
-            next_steps.append("Highlight government-specific features")
-        
-        elif website_analysis['cms'] in ['civicplus', 'granicus', 'revize']:
-            score -= 15
-            reasons.append(f"Already using government CMS ({website_analysis['cms']})")
-            next_steps.append("Research contract renewal dates")
-        
-        # Outdated website bonus
-        if website_analysis['is_outdated']:
-            score += 20
-            reasons.append("Website appears outdated - modernization need")
-            next_steps.append("Emphasize modern design and mobile responsiveness")
-        
-        # Mobile responsiveness
-        if not website_analysis['has_mobile_responsive']:
-            score += 15
-            reasons.append("Website not mobile-responsive")
-            next_steps.append("Demo mobile-first design")
-        
-        # Accessibility issues
-        if website_analysis['accessibility_issues']:
-            score += 10
-            reasons.append("Potential accessibility compliance issues")
-            next_steps.append("Highlight ADA compliance features")
-        
-        # Content management issues
-        for issue in website_analysis['content_management_issues']:
-            score += 10
-            reasons.append(f"Content issue: {issue}")
-            next_steps.append("Offer easy content management demo")
-        
-        # Contact information availability
-        if email:
-            score += 10
-            reasons.append("Direct email contact available")
-            next_steps.append("Send personalized email with demo link")
-        else:
-            score -= 5
-            reasons.append("No direct email contact")
-            next_steps.append("Research contact information")
-        
-        # State-specific scoring (some states more likely to adopt new tech)
-        progressive_states = ['California', 'Washington', 'Colorado', 'North Carolina', 'Virginia']
-        if state in progressive_states:
-            score += 5
-            reasons.append(f"{state} - tech-progressive state")
-        
-        # Priority classification
-        if score >= 60:
-            priority = "High"
-        elif score >= 40:
-            priority = "Medium"
-        else:
-            priority = "Low"
-        
-        return LeadScore(
-            contact_id=contact['id'],
-            municipality=municipality,
-            state=state,
-            score=score,
-            reasons=reasons,
-            priority=priority,
-            website_analysis=website_analysis,
-            next_steps=next_steps
-        )
+        """Calculate lead score based on various factors (rules in lead_scoring)"""
+        batch = LeadBatch()
+        batch.append(contact, website_analysis)
+        batch.score()
+        return LeadScore(**batch.lead(0))
     
-    def qualify_leads(self, limit: int = 50) -> List[LeadScore]:
-        """Qualify leads from the contacts database"""
+    def qualify_leads(self, limit: int = 50, deadline: Optional[Deadline] = None,
+                      restart: bool = False, fetch_workers: int = 4) -> List[LeadScore]:
+        """Qualify leads from the contacts database
+        
+        Each scored lead is checkpointed, so a resumed run reuses earlier
+        scores instead of re-analyzing those websites.
+        """
+        deadline = deadline or Deadline()
+        self.checkpoints.begin_stage('qualify', restart=restart)
+        previous = self.checkpoints.results('qualify')
+        
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         # Get contacts with websites for analysis
-        cursor.execute("""
-            SELECT id, municipality, state, population, email, website, contact_name, title
-            FROM government_contacts 
-            WHERE website IS NOT NULL AND population > 500 AND population < 50000
+        cursor.execute(f"""
+            SELECT {', '.join(CONTACT_FIELDS)}
+            FROM government_contacts gc
+            WHERE {QUALIFY_CANDIDATES}
             ORDER BY population DESC
             LIMIT ?
         """, (limit,))
@@ -246,131 +263,196 @@ class LeadQualifier:
         conn.close()
         
         lead_scores = []
+        pending = []
         
         logger.info(f"Qualifying {len(contacts)} leads...")
         
-        for i, contact_data in enumerate(contacts):
-            contact = {
-                'id': contact_data[0],
-                'municipality': contact_data[1],
-                'state': contact_data[2],
-                'population': contact_data[3],
-                'email': contact_data[4],
-                'website': contact_data[5],
-                'contact_name': contact_data[6],
-                'title': contact_data[7]
-            }
-            
-            logger.info(f"Analyzing {contact['municipality']}, {contact['state']} ({i+1}/{len(contacts)})")
-            
-            # Analyze website technology
-            website_analysis = self.analyze_website_technology(contact['website'])
-            
-            # Calculate lead score
-            lead_score = self.calculate_lead_score(contact, website_analysis)
-            lead_scores.append(lead_score)
+        for contact_data in contacts:
+            if str(contact_data[0]) in previous:
+                lead_scores.append(LeadScore(**previous[str(contact_data[0])]))
+                continue
             
-            # Rate limiting
-            if i % 10 == 0 and i > 0:
-                logger.info(f"Processed {i} contacts...")
+            pending.append(dict(zip(CONTACT_FIELDS, contact_data)))
+        
+        # Websites are fetched fetch_workers at a time; their parsing runs in
+        # the parse pool, so fetch threads are not held up by the GIL
+        with ThreadPoolExecutor(max_workers=max(fetch_workers, 1)) as executor:
+            for start in range(0, len(pending), max(fetch_workers, 1)):
+                if deadline.expired():
+                    logger.info(f"Deadline reached after {len(lead_scores)} leads; progress saved for the next run")
+                    lead_scores.sort(key=lambda x: x.score, reverse=True)
+                    return lead_scores
+                
+                batch = pending[start:start + max(fetch_workers, 1)]
+                for i, contact in enumerate(batch, start + 1):
+                    logger.info(f"Analyzing {contact['municipality']}, {contact['state']} ({i}/{len(pending)})")
+                    self.checkpoints.mark_started('qualify', contact['id'])
+                
+                # Analyze website technology
+                analyses = executor.map(self.analyze_website_technology, [c['website'] for c in batch])
+                
+                for contact, website_analysis in zip(batch, analyses):
+                    try:
+                        # Calculate lead score
+                        lead_score = self.calculate_lead_score(contact, website_analysis)
+                    except Exception as e:
+                        logger.error(f"Error qualifying {contact['municipality']}, {contact['state']}: {e}")
+                        self.checkpoints.mark_failed('qualify', contact['id'], str(e))
+                        continue
+                    
+                    lead_scores.append(lead_score)
+                    self.checkpoints.mark_done('qualify', contact['id'], asdict(lead_score))
+                
+                logger.info(f"Processed {start + len(batch)} contacts...")
+        
+        self.checkpoints.finish_stage('qualify')
         
         # Sort by score (highest first)
         lead_scores.sort(key=lambda x: x.score, reverse=True)
         
         return lead_scores
     
-    def save_qualified_leads(self, lead_scores: List[LeadScore]):
-        """Save qualified leads to database"""
+    def qualify_contact(self, contact: Dict) -> LeadScore:
+        """Analyze a contact's website and score it"""
+        logger.info(f"Analyzing {contact['municipality']}, {contact['state']}")
+        return self.calculate_lead_score(contact, self.analyze_website_technology(contact['website']))
+    
+    def qualify_from_queue(self, limit: int = 50, deadline: Optional[Deadline] = None,
+                           restart: bool = False, fetch_workers: int = 4,
+                           requeue_after: float = REQUEUE_AFTER) -> List[LeadScore]:
+        """Qualify leads as one of possibly many workers sharing the work queue
+        
+        Up to `limit` contacts not yet queued, or last finished more than
+        requeue_after seconds ago, are added to the 'qualify' queue (limit=0
+        only drains), then tasks are leased and scored until none remain.
+        restart drops every task no worker holds a lease on. Leads completed during this drain (by this or any
+        other worker) are returned; older queue results are not.
+        """
+        started = time.time()
+        queue = WorkQueue(self.db_path)
+        if restart:
+            queue.reset('qualify')
+        reopen_before = started - requeue_after
+        
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        
-        # Create qualified_leads table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS qualified_leads (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                contact_id INTEGER,
-                municipality TEXT,
-                state TEXT,
-                score REAL,
-                priority TEXT,
-                reasons TEXT,
-                next_steps TEXT,
-                website_analysis TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (contact_id) REFERENCES government_contacts (id)
+        cursor.execute(f"""
+            SELECT {', '.join(CONTACT_FIELDS)}
+            FROM government_contacts gc
+            WHERE {QUALIFY_CANDIDATES}
+            AND NOT EXISTS (
+                SELECT 1 FROM work_queue wq WHERE wq.queue = 'qualify' AND wq.item = CAST(gc.id AS TEXT)
+                AND NOT (wq.status IN ('done', 'dead') AND wq.updated_at < ?)
             )
-        ''')
-        
-        # Clear existing qualified leads
-        cursor.execute("DELETE FROM qualified_leads")
-        
-        # Insert new qualified leads
-        for lead in lead_scores:
-            cursor.execute('''
-                INSERT INTO qualified_leads 
-                (contact_id, municipality, state, score, priority, reasons, next_steps, website_analysis)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            ORDER BY population DESC
+            LIMIT ?
+        """, (reopen_before, limit))
+        added = queue.enqueue('qualify', (
+            (row[0], dict(zip(CONTACT_FIELDS, row)), row[3] or 0) for row in cursor.fetchall()
+        ), reopen_before=reopen_before)
+        conn.close()
+        logger.info(f"Queued {added} leads; worker {queue.worker_id} draining with {fetch_workers} fetch workers")
+        
+        counts = drain(
+            queue, 'qualify',
+            lambda item, contact: asdict(self.qualify_contact(contact)),
+            concurrency=fetch_workers, deadline=deadline
+        )
+        logger.info(f"Scored {counts['done']} leads; queue now {queue.counts('qualify')}")
+        
+        lead_scores = [LeadScore(**result) for result in queue.results('qualify', since=started).values()]
+        lead_scores.sort(key=lambda x: x.score, reverse=True)
+        return lead_scores
+    
+    def rescore_leads(self) -> List[LeadScore]:
+        """Re-score every contact from the stored website analyses, without the network
+        
+        The whole contacts table is scored at once; reasons are only built
+        for the contacts whose websites have been analyzed, which are returned.
+        """
+        started = time.monotonic()
+        batch = LeadBatch.load(self.db_path)
+        batch.score()
+        lead_scores = [LeadScore(**batch.lead(i)) for i in batch.ranked(batch.analyzed())]
+        logger.info(f"Re-scored {len(batch)} contacts in {time.monotonic() - started:.2f}s; "
+                    f"{len(lead_scores)} have website analyses")
+        return lead_scores
+    
+    def save_qualified_leads(self, lead_scores: List[LeadScore]):
+        """Upsert qualified leads by contact, writing only the ones that changed
+        
+        Leads not in lead_scores are kept. Score and priority changes are
+        recorded in lead_score_history by trigger.
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.executemany(LEAD_UPSERT, (
+            (
                 lead.contact_id,
                 lead.municipality,
                 lead.state,
                 lead.score,
                 lead.priority,
-                json.dumps(lead.reasons),
-                json.dumps(lead.next_steps),
-                json.dumps(lead.website_analysis)
-            ))
-        
+                '\n'.join(lead.reasons),
+                '\n'.join(lead.next_steps),
+                json.dumps(
+                    {key: value for key, value in (lead.website_analysis or {}).items() if key != 'analysis_tier'},
+                    separators=(',', ':')
+                ) if lead.website_analysis is not None else None,
+            )
+            for lead in lead_scores
+        ))
+        changed = cursor.rowcount
         conn.commit()
         conn.close()
         
-        logger.info(f"Saved {len(lead_scores)} qualified leads to database")
+        logger.info(f"Saved {len(lead_scores)} qualified leads to database ({changed} new or changed)")
     
-    def export_qualified_leads(self, filename: str = "qualified_leads.csv"):
-        """Export qualified leads to CSV"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT ql.municipality, ql.state, gc.population, gc.email, gc.website, 
-                   gc.contact_name, gc.title, ql.score, ql.priority, ql.reasons, ql.next_steps
-            FROM qualified_leads ql
-            JOIN government_contacts gc ON ql.contact_id = gc.id
-            ORDER BY ql.score DESC
-        """)
-        
-        rows = cursor.fetchall()
-        
-        import csv
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([
+    def export_qualified_leads(self, filename: str = "qualified_leads.csv", since: bool = False) -> int:
+        """Export qualified leads to CSV or JSONL (gzip-compressed for .gz names)
+        
+        With since=True only leads scored since the previous export to the
+        same filename are written.
+        """
+        def flatten(row):
+            # Reasons and next steps are stored one per line
+            return (*row[:9], (row[9] or '').replace('\n', '; '), (row[10] or '').replace('\n', '; '))
+        
+        where = "WHERE ql.updated_at >= ?" if since else ""
+        count = export_rows(
+            self.db_path, filename,
+            f"""
+                SELECT ql.municipality, ql.state, gc.population, gc.email, gc.website, 
+                       gc.contact_name, gc.title, ql.score, ql.priority, ql.reasons, ql.next_steps
+                FROM qualified_leads ql
+                JOIN government_contacts gc ON ql.contact_id = gc.id
+                {where}
+                ORDER BY ql.score DESC
+            """, (),
+            header=[
                 'Municipality', 'State', 'Population', 'Email', 'Website',
                 'Contact Name', 'Title', 'Lead Score', 'Priority', 'Reasons', 'Next Steps'
-            ])
-            
-            for row in rows:
-                # Parse JSON fields
-                reasons = json.loads(row[9]) if row[9] else []
-                next_steps = json.loads(row[10]) if row[10] else []
-                
-                writer.writerow([
-                    row[0], row[1], row[2], row[3], row[4], row[5], row[6],
-                    row[7], row[8], '; '.join(reasons), '; '.join(next_steps)
-                ])
+            ],
+            keys=[
+                'municipality', 'state', 'population', 'email', 'website',
+                'contact_name', 'title', 'score', 'priority', 'reasons', 'next_steps'
+            ],
+            transform=flatten,
+            watermark=f"qualified_leads:{os.path.basename(filename)}",
+            since=since
+        )
         
-        logger.info(f"Exported {len(rows)} qualified leads to {filename}")
-        conn.close()
+        logger.info(f"Exported {count} qualified leads to {filename}")
+        return count
     
     def get_lead_stats(self) -> Dict:
-        """Get statistics on qualified leads"""
+        """Get statistics on qualified leads from the trigger-maintained lead_stats table"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         stats = {}
         
         # Priority distribution
-        cursor.execute("SELECT priority, COUNT(*) FROM qualified_leads GROUP BY priority")
+        cursor.execute("SELECT priority, SUM(leads) FROM lead_stats GROUP BY priority HAVING SUM(leads) > 0")
         stats['priority_distribution'] = dict(cursor.fetchall())
         
         # Top scoring leads
@@ -383,35 +465,113 @@ class LeadQualifier:
         
         # Average score by state
         cursor.execute("""
-            SELECT ql.state, AVG(ql.score) as avg_score, COUNT(*) as count
-            FROM qualified_leads ql 
-            GROUP BY ql.state 
-            HAVING COUNT(*) >= 3
+            SELECT state, SUM(score_sum) / SUM(leads) as avg_score, SUM(leads) as count
+            FROM lead_stats
+            GROUP BY state 
+            HAVING SUM(leads) >= 3
             ORDER BY avg_score DESC
         """)
         stats['state_averages'] = cursor.fetchall()
         
+        # Biggest moves between each lead's last two scores
+        cursor.execute("""
+            SELECT ql.municipality, ql.state, h.previous_score, h.score
+            FROM (
+                SELECT contact_id, score,
+                       LAG(score) OVER (PARTITION BY contact_id ORDER BY id) AS previous_score,
+                       ROW_NUMBER() OVER (PARTITION BY contact_id ORDER BY id DESC) AS recency
+                FROM lead_score_history
+            ) h
+            JOIN qualified_leads ql ON ql.contact_id = h.contact_id
+            WHERE h.recency = 1 AND h.previous_score IS NOT NULL AND h.score != h.previous_score
+            ORDER BY ABS(h.score - h.previous_score) DESC LIMIT 10
+        """)
+        stats['score_changes'] = cursor.fetchall()
+        
         conn.close()
         return stats
+    
+    def score_history(self, contact_id: int) -> List[tuple]:
+        """(scored_at, score, priority) for every score change of a lead, oldest first"""
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(
+            "SELECT scored_at, score, priority FROM lead_score_history WHERE contact_id = ? ORDER BY id",
+            (contact_id,)
+        ).fetchall()
+        conn.close()
+        return rows
 
 def main():
     """Main execution function"""
-    qualifier = LeadQualifier()
+    parser = argparse.ArgumentParser(description="Government Contact Lead Qualification")
+    parser.add_argument('--limit', type=int, default=30, help="Maximum leads to qualify")
+    parser.add_argument('--deadline', type=float,
+                        help="Stop cleanly after this many seconds, keeping the checkpoint")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore an unfinished run and start from scratch")
+    parser.add_argument('--parse-workers', type=int,
+                        help="HTML parsing processes (default: CPU count, 0 parses inline)")
+    parser.add_argument('--export', default="qualified_leads.csv",
+                        help="Export file (.csv or .jsonl, add .gz to compress)")
+    parser.add_argument('--since', action='store_true',
+                        help="Export only leads scored since the previous export")
+    parser.add_argument('--queue', action='store_true',
+                        help="Work from the shared queue so several workers can qualify together")
+    parser.add_argument('--requeue-days', type=float, default=REQUEUE_AFTER / 86400,
+                        help="With --queue, qualify leads again once their last run is this many days old")
+    parser.add_argument('--cms-rules', default=DEFAULT_RULES_PATH,
+                        help="CMS fingerprint rules file (JSON)")
+    parser.add_argument('--rescore', action='store_true',
+                        help="Re-score from stored website analyses instead of fetching sites")
+    parser.add_argument('--reanalyze', action='store_true',
+                        help="Analyze every site again, even if unchanged since its last snapshot")
+    parser.add_argument('--redesigned', type=float, metavar='DAYS',
+                        help="List sites redesigned in the last DAYS days and exit")
+    parser.add_argument('--no-prescreen', action='store_true',
+                        help="Fully analyze every site, including known government CMS customers")
+    args = parser.parse_args()
+    
+    qualifier = LeadQualifier(parse_workers=args.parse_workers, cms_rules_path=args.cms_rules,
+                              prescreen=not args.no_prescreen, reuse_snapshots=not args.reanalyze)
     
     print("🎯 Government Contact Lead Qualification")
     print("=" * 45)
     
+    if args.redesigned is not None:
+        redesigns = qualifier.snapshots.redesigned(time.time() - args.redesigned * 24 * 3600)
+        print(f"\n🆕 {len(redesigns)} sites redesigned in the last {args.redesigned:g} days:")
+        for redesign in redesigns:
+            cms = redesign['cms']
+            if redesign['previous_cms'] != cms:
+                cms = f"{redesign['previous_cms']} -> {cms}"
+            print(f"  {redesign['website']}: {redesign['distance']} bits changed ({cms})")
+        qualifier.parse_pool.close()
+        qualifier.link_checker.close()
+        return
+    
     # Qualify leads
-    print("\n🔍 Analyzing websites and qualifying leads...")
-    lead_scores = qualifier.qualify_leads(limit=30)  # Start small for testing
+    if args.rescore:
+        print("\n🔁 Re-scoring leads from stored website analyses...")
+        lead_scores = qualifier.rescore_leads()
+    elif args.queue:
+        print("\n🔍 Analyzing websites and qualifying leads...")
+        lead_scores = qualifier.qualify_from_queue(limit=args.limit, deadline=Deadline(args.deadline),
+                                                   restart=args.restart,
+                                                   requeue_after=args.requeue_days * 86400)
+    else:
+        print("\n🔍 Analyzing websites and qualifying leads...")
+        lead_scores = qualifier.qualify_leads(limit=args.limit, deadline=Deadline(args.deadline),
+                                              restart=args.restart)
+    qualifier.parse_pool.close()
+    qualifier.link_checker.close()
     
     # Save to database
     print("\n💾 Saving qualified leads...")
     qualifier.save_qualified_leads(lead_scores)
     
     # Export to CSV
-    print("\n📄 Exporting to CSV...")
-    qualifier.export_qualified_leads()
+    print("\n📄 Exporting qualified leads...")
+    qualifier.export_qualified_leads(args.export, since=args.since)
     
     # Show statistics
     print("\n📊 Lead Qualification Statistics:")
@@ -429,8 +589,13 @@ def main():
     for state, avg_score, count in stats['state_averages'][:5]:
         print(f"  {state}: {avg_score:.1f} (n={count})")
     
+    if stats['score_changes']:
+        print(f"\nBiggest Score Changes:")
+        for municipality, state, previous_score, score in stats['score_changes'][:5]:
+            print(f"  {municipality}, {state}: {previous_score:.1f} -> {score:.1f}")
+    
     print(f"\n✅ Lead qualification complete!")
-    print(f"📄 Results saved to: qualified_leads.csv")
+    print(f"📄 Results saved to: {args.export}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
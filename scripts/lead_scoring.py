@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Batch Lead Scoring
+The lead scoring rules as lookup tables applied to columns of contact and
+website-analysis data, so the whole contacts table can be re-scored from
+stored analyses in one pass without the network. Reasons and next steps
+are only built for the rows asked for.
+"""
+
+import json
+import sqlite3
+from array import array
+from bisect import bisect_right
+from itertools import repeat
+from operator import mul
+from typing import Dict, List, Optional, Tuple
+
+# Population bands: under 500, 500-999, 1,000-25,000 (the sweet spot), over 25,000
+POPULATION_BOUNDS = (500, 1000, 25001)
+POPULATION_POINTS = (-10, 15, 25, 5)
+POPULATION_REASONS = (
+    "Very small population ({population:,}) - limited budget",
+    "Small but viable population ({population:,})",
+    "Ideal population size ({population:,})",
+    "Larger municipality ({population:,}) - may have existing solutions",
+)
+
+# CMS classes; sites never analyzed get no technology points either way
+CMS_NOT_ANALYZED, CMS_NONE, CMS_GENERAL, CMS_GOVERNMENT, CMS_OTHER = range(5)
+CMS_POINTS = (0, 20, 15, -15, 0)
+CMS_REASONS = (
+    None,
+    "No modern CMS detected - high potential need",
+    "Using {cms} - not government-specific",
+    "Already using government CMS ({cms})",
+    None,
+)
+CMS_NEXT_STEPS = (
+    None, "Offer free website audit", "Highlight government-specific features",
+    "Research contract renewal dates", None,
+)
+
+# Widely used CMSs that are not built for government
+GENERAL_CMS = ('wordpress', 'joomla')
+
+# Yes/no website findings: (column, points, reason, next step) when set
+FLAG_RULES = (
+    ('outdated', 20, "Website appears outdated - modernization need",
+     "Emphasize modern design and mobile responsiveness"),
+    ('not_mobile', 15, "Website not mobile-responsive", "Demo mobile-first design"),
+    ('accessibility', 10, "Potential accessibility compliance issues", "Highlight ADA compliance features"),
+)
+
+CONTENT_ISSUE_POINTS = 10  # Per content management issue
+
+EMAIL_POINTS = (-5, 10)  # Without, with a direct email contact
+EMAIL_REASONS = ("No direct email contact", "Direct email contact available")
+EMAIL_NEXT_STEPS = ("Research contact information", "Send personalized email with demo link")
+
+# Some states are more likely to adopt new tech
+PROGRESSIVE_STATES = ('California', 'Washington', 'Colorado', 'North Carolina', 'Virginia')
+PROGRESSIVE_POINTS = (0, 5)
+
+# Priority by score: under 40, 40-59, 60 and over
+PRIORITY_BOUNDS = (40, 60)
+PRIORITIES = ('Low', 'Medium', 'High')
+
+
+def cms_class(analysis: Optional[Dict]) -> int:
+    if analysis is None:
+        return CMS_NOT_ANALYZED
+    cms = analysis.get('cms')
+    if cms in ('Unknown', 'Error'):
+        return CMS_NONE
+    if cms in GENERAL_CMS:
+        return CMS_GENERAL
+    if analysis.get('cms_category') == 'government':
+        return CMS_GOVERNMENT
+    return CMS_OTHER
+
+
+def take(points, codes):
+    """points[code] for each code"""
+    return map(points.__getitem__, codes)
+
+
+class LeadBatch:
+    """Contacts and their website analyses as columns, scored all at once
+
+    Each rule contributes one column of points looked up by a small integer
+    code per row; score() sums the columns. Contacts without an analysis
+    are scored on their contact data alone.
+    """
+
+    def __init__(self):
+        self.contact_ids = array('q')
+        self.municipalities: List[str] = []
+        self.states: List[str] = []
+        self.population = array('q')
+        self.population_band = array('b')
+        self.cms = array('b')
+        self.flags = {column: array('b') for column, *_ in FLAG_RULES}
+        self.content_issues = array('h')
+        self.has_email = array('b')
+        self.progressive = array('b')
+        self.analyses: List[Optional[Dict]] = []
+        self.scores = array('d')
+        self.priorities = array('b')
+
+    def __len__(self) -> int:
+        return len(self.contact_ids)
+
+    def append(self, contact: Dict, analysis: Optional[Dict] = None):
+        """Add a contact (id, municipality, state, population, email) and its analysis"""
+        population = contact.get('population') or 0
+        self.contact_ids.append(contact['id'])
+        self.municipalities.append(contact['municipality'])
+        self.states.append(contact['state'])
+        self.population.append(population)
+        self.population_band.append(bisect_right(POPULATION_BOUNDS, population))
+        self.cms.append(cms_class(analysis))
+        details = analysis or {}
+        self.flags['outdated'].append(bool(details.get('is_outdated')))
+        self.flags['not_mobile'].append(analysis is not None and not analysis.get('has_mobile_responsive'))
+        self.flags['accessibility'].append(bool(details.get('accessibility_issues')))
+        self.content_issues.append(len(details.get('content_management_issues') or ()))
+        self.has_email.append(bool(contact.get('email')))
+        self.progressive.append(contact['state'] in PROGRESSIVE_STATES)
+        self.analyses.append(analysis)
+
+    @classmethod
+    def load(cls, db_path: str) -> 'LeadBatch':
+        """Every contact with its stored website analysis, if any"""
+        batch = cls()
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute('''
+            SELECT gc.id, gc.municipality, gc.state, gc.population, gc.email, ql.website_analysis
+            FROM government_contacts gc
+            LEFT JOIN qualified_leads ql ON ql.contact_id = gc.id
+        ''')
+        for contact_id, municipality, state, population, email, analysis in rows:
+            batch.append(
+                {'id': contact_id, 'municipality': municipality, 'state': state,
+                 'population': population, 'email': email},
+                json.loads(analysis) if analysis else None
+            )
+        conn.close()
+        return batch
+
+    def score(self) -> array:
+        """Score every row; returns the scores, also kept with the priorities"""
+        columns = [
+            take(POPULATION_POINTS, self.population_band),
+            take(CMS_POINTS, self.cms),
+            map(mul, self.content_issues, repeat(CONTENT_ISSUE_POINTS)),
+            take(EMAIL_POINTS, self.has_email),
+            take(PROGRESSIVE_POINTS, self.progressive),
+        ]
+        columns += [take((0, points), self.flags[column]) for column, points, *_ in FLAG_RULES]
+        self.scores = array('d', map(float, map(sum, zip(*columns))))
+        self.priorities = array('b', map(bisect_right, repeat(PRIORITY_BOUNDS), self.scores))
+        return self.scores
+
+    def analyzed(self) -> List[int]:
+        """Rows that have a website analysis"""
+        return [i for i, cms in enumerate(self.cms) if cms != CMS_NOT_ANALYZED]
+
+    def ranked(self, rows: Optional[List[int]] = None) -> List[int]:
+        """Rows (default: all) ordered by score, highest first"""
+        rows = range(len(self)) if rows is None else rows
+        return sorted(rows, key=self.scores.__getitem__, reverse=True)
+
+    def explain(self, i: int) -> Tuple[List[str], List[str]]:
+        """(reasons, next_steps) for row i, in the order the rules apply"""
+        reasons = [POPULATION_REASONS[self.population_band[i]].format(population=self.population[i])]
+        next_steps = []
+
+        cms = self.cms[i]
+        if CMS_REASONS[cms]:
+            reasons.append(CMS_REASONS[cms].format(cms=self.analyses[i]['cms']))
+            next_steps.append(CMS_NEXT_STEPS[cms])
+
+        for column, _, reason, next_step in FLAG_RULES:
+            if self.flags[column][i]:
+                reasons.append(reason)
+                next_steps.append(next_step)
+
+        if self.content_issues[i]:
+            for issue in self.analyses[i]['content_management_issues']:
+                reasons.append(f"Content issue: {issue}")
+                next_steps.append("Offer easy content management demo")
+
+        reasons.append(EMAIL_REASONS[self.has_email[i]])
+        next_steps.append(EMAIL_NEXT_STEPS[self.has_email[i]])
+
+        if self.progressive[i]:
+            reasons.append(f"{self.states[i]} - tech-progressive state")
+
+        return reasons, next_steps
+
+    def lead(self, i: int) -> Dict:
+        """Row i as LeadScore fields"""
+        reasons, next_steps = self.explain(i)
+        return {
+            'contact_id': self.contact_ids[i],
+            'municipality': self.municipalities[i],
+            'state': self.states[i],
+            'score': self.scores[i],
+            'reasons': reasons,
+            'priority': PRIORITIES[self.priorities[i]],
+            'website_analysis': self.analyses[i],
+            'next_steps': next_steps,
+        }
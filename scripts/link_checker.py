@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Broken Link Checker
+Resolves a page's links against its URL and checks them concurrently
+within a per-site time budget. Link statuses are kept in a shared store
+with a TTL, so targets linked from many sites (state portals, county
+sites) are only checked once.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+import requests
+
+from host_throttle import HostController
+from http_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+# Statuses that do not mean the link is broken: the server refuses HEAD,
+# or is rate limiting us
+NOT_BROKEN_STATUSES = {405, 429}
+
+
+def resolve_links(base_url: str, hrefs: Iterable[str], limit: int) -> List[str]:
+    """Up to limit distinct absolute http(s) URLs for hrefs, without fragments"""
+    urls = []
+    seen = set()
+    for href in hrefs:
+        url = urldefrag(urljoin(base_url, href.strip()))[0]
+        if urlsplit(url).scheme not in ('http', 'https'):
+            continue
+        key = normalize_url(url)
+        if key in seen:
+            continue
+        seen.add(key)
+        urls.append(url)
+        if len(urls) >= limit:
+            break
+    return urls
+
+
+class LinkStatusStore:
+    """URL -> (broken, status) results, kept in memory and in the pipeline database"""
+
+    def __init__(self, db_path: str, ttl: float = 24 * 3600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._statuses: Dict[str, Tuple[bool, Optional[int], float]] = {}
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS link_status (
+                url_key TEXT PRIMARY KEY,
+                broken INTEGER NOT NULL,
+                status INTEGER,
+                checked_at REAL NOT NULL
+            )
+        ''')
+        rows = conn.execute(
+            "SELECT url_key, broken, status, checked_at FROM link_status WHERE checked_at >= ?",
+            (time.time() - ttl,)
+        )
+        for url_key, broken, status, checked_at in rows:
+            self._statuses[url_key] = (bool(broken), status, checked_at)
+        conn.commit()
+        conn.close()
+
+    def get(self, url: str) -> Optional[bool]:
+        """Whether a URL was found broken, or None if not checked within the TTL"""
+        with self._lock:
+            result = self._statuses.get(normalize_url(url))
+        if result is None or time.time() - result[2] > self.ttl:
+            return None
+        return result[0]
+
+    def put(self, url: str, broken: bool, status: Optional[int]):
+        key = normalize_url(url)
+        checked_at = time.time()
+        with self._lock:
+            self._statuses[key] = (broken, status, checked_at)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute(
+                "INSERT OR REPLACE INTO link_status (url_key, broken, status, checked_at) VALUES (?, ?, ?, ?)",
+                (key, int(broken), status, checked_at)
+            )
+            conn.commit()
+            conn.close()
+
+
+class LinkChecker:
+    """Concurrent HEAD checks shared by every site being analyzed
+
+    A URL already being checked for another site is waited on rather than
+    requested twice.
+    """
+
+    def __init__(self, session: requests.Session, store: LinkStatusStore,
+                 hosts: Optional[HostController] = None, workers: int = 16,
+                 budget: float = 10.0, max_links: int = 10):
+        self.session = session
+        self.store = store
+        self.hosts = hosts or HostController()
+        self.budget = budget  # Seconds allowed per site
+        self.max_links = max_links  # Links sampled per site
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+
+    def check(self, url: str) -> bool:
+        """HEAD a URL and record whether it is broken"""
+        status = None
+        try:
+            with self.hosts.request(url, timeout=5) as slot:
+                response = self.session.head(url, allow_redirects=True, timeout=slot.timeout)
+                slot.record(response)
+            status = response.status_code
+            broken = status >= 400 and status not in NOT_BROKEN_STATUSES
+        except requests.RequestException:
+            broken = True
+        self.store.put(url, broken, status)
+        return broken
+
+    def _submit(self, url: str) -> Future:
+        key = normalize_url(url)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            future = self._executor.submit(self.check, url)
+            self._pending[key] = future
+        # Outside the lock: a check that has already finished runs the callback here
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key: str, future: Future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def count_broken(self, base_url: str, hrefs: Iterable[str]) -> Tuple[int, int]:
+        """(broken, checked) for a sample of a page's links
+
+        Links still unchecked when the budget runs out are left out of both
+        counts; their checks finish in the background and are stored.
+        """
+        broken = checked = 0
+        futures = []
+        for url in resolve_links(base_url, hrefs, self.max_links):
+            known = self.store.get(url)
+            if known is None:
+                futures.append(self._submit(url))
+            else:
+                broken += known
+                checked += 1
+
+        done, _ = wait(futures, timeout=self.budget)
+        for future in done:
+            try:
+                broken += future.result()
+                checked += 1
+            except Exception as e:
+                logger.debug(f"Link check failed: {e}")
+        return broken, checked
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Municipality Entity Resolution
+Maps differently-spelled contact rows ("Abanda CDP, Alabama", "Abanda",
+"Town of Abanda") onto one canonical municipality so each town is only
+enriched and qualified once
+"""
+
+import logging
+import re
+import sqlite3
+import unicodedata
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Census legal/statistical area suffixes, longest first so "city and borough"
+# wins over "borough"
+PLACE_SUFFIXES = (
+    'consolidated government (balance)', 'metropolitan government (balance)',
+    'metro government (balance)', 'unified government (balance)', '(balance)',
+    'city and borough', 'urban county', 'comunidad', 'zona urbana', 'municipality',
+    'plantation', 'township', 'borough', 'village', 'city', 'town', 'cdp',
+)
+
+PLACE_PREFIXES = ('city of ', 'town of ', 'village of ', 'borough of ', 'township of ')
+
+# Abbreviations folded to one spelling before the key is built
+WORD_FORMS = {
+    'saint': 'st', 'ste': 'st', 'mount': 'mt', 'fort': 'ft', 'and': '&',
+}
+
+# Columns copied from duplicate rows into the canonical row when it lacks them
+MERGED_COLUMNS = ('population', 'contact_name', 'title', 'email', 'phone', 'website', 'address')
+
+
+def normalize_municipality_name(name: str, state: str) -> str:
+    """Strip the state, place-type suffixes and prefixes from a municipality name
+
+    The place-type suffix is only stripped from Census-form names ("Iowa
+    City city, Iowa"); elsewhere "City" or "Town" is usually part of the
+    name itself ("Iowa City", "Union City").
+    """
+    text = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    text = ' '.join(text.lower().split())
+
+    state_suffix = f", {state.lower()}"
+    census_form = bool(state) and text.endswith(state_suffix)
+    if census_form:
+        text = text[:-len(state_suffix)]
+
+    for prefix in PLACE_PREFIXES:
+        if text.startswith(prefix) and len(text) > len(prefix):
+            text = text[len(prefix):]
+            break
+
+    for suffix in PLACE_SUFFIXES if census_form else ():
+        if text.endswith(' ' + suffix):
+            text = text[:-len(suffix) - 1]
+            break
+
+    return text.strip()
+
+
+def municipality_key(name: str, state: str) -> str:
+    """Blocking key: normalized name with punctuation and spacing removed"""
+    words = re.findall(r"[a-z0-9&]+", normalize_municipality_name(name, state).replace('.', ''))
+    return ''.join(WORD_FORMS.get(word, word) for word in words)
+
+
+def init_resolution_schema(cursor: sqlite3.Cursor):
+    """Create the municipalities table and the contact -> municipality link"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS municipalities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            state TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            name TEXT NOT NULL,
+            canonical_contact_id INTEGER,
+            UNIQUE(state, name_key)
+        )
+    ''')
+
+    cursor.execute("PRAGMA table_info(government_contacts)")
+    if 'municipality_id' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE government_contacts ADD COLUMN municipality_id INTEGER REFERENCES municipalities (id)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_contacts_municipality ON government_contacts (municipality_id)"
+    )
+
+
+def resolve_municipalities(db_path: str) -> Dict[str, int]:
+    """Link unresolved contacts to canonical municipalities and merge duplicates
+
+    Only contacts without a municipality_id are examined, so repeat runs are
+    incremental. For every municipality touched, the canonical contact (the
+    lowest-id row with a population, i.e. the Census row when present) is
+    filled in from its duplicates.
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    init_resolution_schema(cursor)
+
+    cursor.execute("SELECT id, municipality, state FROM government_contacts WHERE municipality_id IS NULL")
+    pending = cursor.fetchall()
+
+    links = []
+    touched = set()
+    for contact_id, municipality, state in pending:
+        key = municipality_key(municipality, state) or municipality.lower()
+        cursor.execute(
+            "INSERT OR IGNORE INTO municipalities (state, name_key, name) VALUES (?, ?, ?)",
+            (state, key, normalize_municipality_name(municipality, state).title() or municipality)
+        )
+        cursor.execute("SELECT id FROM municipalities WHERE state = ? AND name_key = ?", (state, key))
+        municipality_id = cursor.fetchone()[0]
+        links.append((municipality_id, contact_id))
+        touched.add(municipality_id)
+
+    cursor.executemany("UPDATE government_contacts SET municipality_id = ? WHERE id = ?", links)
+
+    merged = 0
+    for municipality_id in touched:
+        cursor.execute("""
+            SELECT id FROM government_contacts WHERE municipality_id = ?
+            ORDER BY population IS NULL, id
+        """, (municipality_id,))
+        ids = [row[0] for row in cursor.fetchall()]
+        canonical_id = ids[0]
+        cursor.execute(
+            "UPDATE municipalities SET canonical_contact_id = ? WHERE id = ?", (canonical_id, municipality_id)
+        )
+        if len(ids) < 2:
+            continue
+
+        assignments = ', '.join(
+            f"""{column} = COALESCE({column}, (
+                SELECT d.{column} FROM government_contacts d
+                WHERE d.municipality_id = :municipality_id AND d.id != :canonical_id
+                AND d.{column} IS NOT NULL ORDER BY d.id LIMIT 1
+            ))"""
+            for column in MERGED_COLUMNS
+        )
+        # Only rows a duplicate can actually fill in are touched, so
+        # last_updated (and --since exports) only move on a real merge
+        fillable = ' OR '.join(
+            f"""({column} IS NULL AND EXISTS (
+                SELECT 1 FROM government_contacts d
+                WHERE d.municipality_id = :municipality_id AND d.id != :canonical_id
+                AND d.{column} IS NOT NULL
+            ))"""
+            for column in MERGED_COLUMNS
+        )
+        try:
+            cursor.execute(
+                f"""
+                    UPDATE government_contacts SET {assignments}, last_updated = CURRENT_TIMESTAMP
+                    WHERE id = :canonical_id AND ({fillable})
+                """,
+                {'municipality_id': municipality_id, 'canonical_id': canonical_id}
+            )
+            merged += cursor.rowcount
+        except sqlite3.IntegrityError as e:
+            # Borrowing an email can collide with another row's identity key
+            logger.warning(f"Could not merge duplicates into contact {canonical_id}: {e}")
+
+    conn.commit()
+    conn.close()
+
+    logger.info(f"Resolved {len(pending)} contacts into {len(touched)} municipalities ({merged} merged)")
+    return {'resolved': len(pending), 'municipalities': len(touched), 'merged': merged}
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Pipeline Checkpoints
+Persistent per-item stage status stored in government_contacts.db so an
+interrupted scrape/enrich/qualify run resumes where it stopped
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Deadline:
+    """Wall-clock time budget for a stage; None means unlimited"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.started = time.monotonic()
+
+    def remaining(self) -> Optional[float]:
+        if self.seconds is None:
+            return None
+        return self.seconds - (time.monotonic() - self.started)
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+
+class CheckpointStore:
+    """Tracks stage runs and the status of every item processed in them
+
+    A stage run stays open until finish_stage() is called. Starting a stage
+    whose last run never finished resumes that run, so items already marked
+    done are skipped; starting after a finished run opens a fresh one.
+    """
+
+    def __init__(self, db_path: str = "government_contacts.db"):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Create checkpoint tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pipeline_runs (
+                stage TEXT PRIMARY KEY,
+                run_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pipeline_checkpoints (
+                stage TEXT NOT NULL,
+                item TEXT NOT NULL,
+                run_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                result TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (stage, item)
+            )
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def begin_stage(self, stage: str, restart: bool = False) -> int:
+        """Open or resume a run of a stage and return its run id"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT run_id, status FROM pipeline_runs WHERE stage = ?", (stage,))
+        row = cursor.fetchone()
+
+        if row and row[1] == 'running' and not restart:
+            run_id = row[0]
+            logger.info(f"Resuming {stage} run {run_id}")
+        else:
+            run_id = row[0] + 1 if row else 1
+            cursor.execute('''
+                INSERT OR REPLACE INTO pipeline_runs (stage, run_id, status, started_at, finished_at)
+                VALUES (?, ?, 'running', CURRENT_TIMESTAMP, NULL)
+            ''', (stage, run_id))
+
+        conn.commit()
+        conn.close()
+        return run_id
+
+    def finish_stage(self, stage: str):
+        """Close the current run so the next start begins from scratch"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "UPDATE pipeline_runs SET status = 'complete', finished_at = CURRENT_TIMESTAMP WHERE stage = ?",
+            (stage,)
+        )
+        conn.commit()
+        conn.close()
+
+    def current_run(self, stage: str) -> int:
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute("SELECT run_id FROM pipeline_runs WHERE stage = ?", (stage,)).fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def done_items(self, stage: str) -> Set[str]:
+        """Items completed in the current run of a stage"""
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT c.item FROM pipeline_checkpoints c
+            JOIN pipeline_runs r ON r.stage = c.stage AND r.run_id = c.run_id
+            WHERE c.stage = ? AND c.status = 'done'
+        ''', (stage,)).fetchall()
+        conn.close()
+        return {row[0] for row in rows}
+
+    def results(self, stage: str) -> Dict[str, object]:
+        """Stored results of items completed in the current run"""
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT c.item, c.result FROM pipeline_checkpoints c
+            JOIN pipeline_runs r ON r.stage = c.stage AND r.run_id = c.run_id
+            WHERE c.stage = ? AND c.status = 'done' AND c.result IS NOT NULL
+        ''', (stage,)).fetchall()
+        conn.close()
+        return {item: json.loads(result) for item, result in rows}
+
+    def mark_started(self, stage: str, item):
+        """Record an attempt at an item; attempts reset when a new run starts"""
+        run_id = self.current_run(stage)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            INSERT INTO pipeline_checkpoints (stage, item, run_id, status, attempts)
+            VALUES (?, ?, ?, 'in_progress', 1)
+            ON CONFLICT (stage, item) DO UPDATE SET
+                status = 'in_progress',
+                attempts = CASE WHEN run_id = excluded.run_id THEN attempts + 1 ELSE 1 END,
+                run_id = excluded.run_id,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (stage, str(item), run_id))
+        conn.commit()
+        conn.close()
+
+    def mark_done(self, stage: str, item, result=None):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            UPDATE pipeline_checkpoints
+            SET status = 'done', last_error = NULL, result = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE stage = ? AND item = ?
+        ''', (json.dumps(result) if result is not None else None, stage, str(item)))
+        conn.commit()
+        conn.close()
+
+    def mark_failed(self, stage: str, item, error: str):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            UPDATE pipeline_checkpoints
+            SET status = 'failed', last_error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE stage = ? AND item = ?
+        ''', (error, stage, str(item)))
+        conn.commit()
+        conn.close()
+
+    def stage_summary(self, stage: str) -> Dict[str, int]:
+        """Item counts by status for the current run"""
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT c.status, COUNT(*) FROM pipeline_checkpoints c
+            JOIN pipeline_runs r ON r.stage = c.stage AND r.run_id = c.run_id
+            WHERE c.stage = ?
+            GROUP BY c.status
+        ''', (stage,)).fetchall()
+        conn.close()
+        return dict(rows)
@@ -7,9 +7,18 @@ Creates a sample of high-potential government leads for immediate outreach
 import sqlite3
 import csv
 import random
+import argparse
+from typing import Optional
 
-def create_sample_leads():
-    """Create a curated sample of high-potential leads"""
+from gov_registry import GovRegistry
+
+def create_sample_leads(gov_registry_path: Optional[str] = None):
+    """Create a curated sample of high-potential leads
+    
+    With a .gov registry, likely websites and emails use the registered
+    domain when the municipality is listed there.
+    """
+    registry = GovRegistry.load(gov_registry_path) if gov_registry_path else None
     
     # Connect to database
     conn = sqlite3.connect("government_contacts.db")
@@ -43,12 +52,18 @@ def create_sample_leads():
             f"https://{municipality_clean}.gov"
         ]
         
+        email_domain = f"{municipality_clean}.gov"
+        registered_website = registry.match(municipality, state) if registry else None
+        if registered_website:
+            possible_websites.insert(0, registered_website)
+            email_domain = registered_website.split('://', 1)[1].removeprefix('www.')
+        
         # Generate likely contact emails
         likely_emails = [
-            f"clerk@{municipality_clean}.gov",
-            f"info@{municipality_clean}.gov",
-            f"mayor@{municipality_clean}.gov",
-            f"citymanager@{municipality_clean}.gov"
+            f"clerk@{email_domain}",
+            f"info@{email_domain}",
+            f"mayor@{email_domain}",
+            f"citymanager@{email_domain}"
         ]
         
         # Calculate basic lead score
@@ -115,4 +130,8 @@ def create_sample_leads():
         print(f"  {i}. {lead['municipality']}, {lead['state']} (Pop: {lead['population']:,}, Score: {lead['score']})")
 
 if __name__ == "__main__":
-    create_sample_leads()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Quick Sample Lead Generator")
+    parser.add_argument('--gov-registry',
+                        help="Local copy of the .gov domain list (CSV) for registered websites")
+    args = parser.parse_args()
+    create_sample_leads(args.gov_registry)
\ No newline at end of file
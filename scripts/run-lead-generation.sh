@@ -10,17 +10,25 @@ echo "====================================="
 echo "📦 Installing Python requirements..."
 pip3 install requests beautifulsoup4
 
+# Optional per-stage time budget in seconds, e.g. STAGE_DEADLINE=3600.
+# Stages stop cleanly when it runs out and resume from their checkpoint
+# on the next run.
+STAGE_ARGS=()
+if [ -n "$STAGE_DEADLINE" ]; then
+    STAGE_ARGS=(--deadline "$STAGE_DEADLINE")
+fi
+
 echo ""
 echo "Step 1: Scraping government contact databases..."
-python3 government-contact-scraper.py
+python3 government-contact-scraper.py "${STAGE_ARGS[@]}"
 
 echo ""
 echo "Step 2: Enriching contacts with additional information..."
-python3 contact-enrichment.py
+python3 contact-enrichment.py "${STAGE_ARGS[@]}"
 
 echo ""
 echo "Step 3: Qualifying and scoring leads..."
-python3 lead-qualification.py
+python3 lead-qualification.py "${STAGE_ARGS[@]}"
 
 echo ""
 echo "🎉 Lead generation complete!"
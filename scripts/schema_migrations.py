@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Schema Migrations
+Secondary indexes for the pipeline's access paths and trigger-maintained
+statistics tables, so stats and stage queries avoid full-table scans
+"""
+
+import sqlite3
+
+
+def table_exists(cursor: sqlite3.Cursor, name: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def index_exists(cursor: sqlite3.Cursor, name: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def migrate_contacts(cursor: sqlite3.Cursor):
+    """Add indexes and the contact_stats table for government_contacts"""
+    # enrich_contacts: (website IS NULL OR email IS NULL) AND population < ?
+    # ORDER BY population DESC, covering id, municipality and state
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_contacts_enrich
+        ON government_contacts (population, municipality, state)
+        WHERE website IS NULL OR email IS NULL
+    ''')
+
+    # qualify_leads: website IS NOT NULL AND population BETWEEN ... ORDER BY population DESC
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_contacts_qualify
+        ON government_contacts (population)
+        WHERE website IS NOT NULL
+    ''')
+
+    # quick-sample.py: state IN (...) AND population BETWEEN ..., covering municipality
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_contacts_state_population
+        ON government_contacts (state, population, municipality)
+    ''')
+
+    created = not table_exists(cursor, 'contact_stats')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS contact_stats (
+            state TEXT PRIMARY KEY,
+            contacts INTEGER NOT NULL DEFAULT 0,
+            contacts_with_email INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_contact_stats_insert
+        AFTER INSERT ON government_contacts
+        BEGIN
+            INSERT INTO contact_stats (state, contacts, contacts_with_email)
+            VALUES (NEW.state, 1, NEW.email IS NOT NULL)
+            ON CONFLICT (state) DO UPDATE SET
+                contacts = contacts + 1,
+                contacts_with_email = contacts_with_email + excluded.contacts_with_email;
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_contact_stats_delete
+        AFTER DELETE ON government_contacts
+        BEGIN
+            UPDATE contact_stats SET
+                contacts = contacts - 1,
+                contacts_with_email = contacts_with_email - (OLD.email IS NOT NULL)
+            WHERE state = OLD.state;
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_contact_stats_update
+        AFTER UPDATE OF state, email ON government_contacts
+        WHEN OLD.state IS NOT NEW.state OR (OLD.email IS NULL) != (NEW.email IS NULL)
+        BEGIN
+            UPDATE contact_stats SET
+                contacts = contacts - 1,
+                contacts_with_email = contacts_with_email - (OLD.email IS NOT NULL)
+            WHERE state = OLD.state;
+            INSERT INTO contact_stats (state, contacts, contacts_with_email)
+            VALUES (NEW.state, 1, NEW.email IS NOT NULL)
+            ON CONFLICT (state) DO UPDATE SET
+                contacts = contacts + 1,
+                contacts_with_email = contacts_with_email + excluded.contacts_with_email;
+        END
+    ''')
+
+    if created:
+        # Backfill once from the existing rows; triggers keep it current after this
+        cursor.execute('''
+            INSERT INTO contact_stats (state, contacts, contacts_with_email)
+            SELECT state, COUNT(*), COUNT(email) FROM government_contacts GROUP BY state
+        ''')
+
+
+def migrate_leads(cursor: sqlite3.Cursor):
+    """Create qualified_leads with its indexes and the lead_stats table"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS qualified_leads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contact_id INTEGER,
+            municipality TEXT,
+            state TEXT,
+            score REAL,
+            priority TEXT,
+            reasons TEXT,
+            next_steps TEXT,
+            website_analysis TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (contact_id) REFERENCES government_contacts (id)
+        )
+    ''')
+
+    # Leads used to be rewritten wholesale with JSON-encoded reasons; they are
+    # now upserted per contact, stamped with updated_at, and reasons and next
+    # steps are stored as newline-separated text
+    cursor.execute("PRAGMA table_info(qualified_leads)")
+    if 'updated_at' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE qualified_leads ADD COLUMN updated_at TIMESTAMP")
+        cursor.execute('''
+            UPDATE qualified_leads SET
+                updated_at = created_at,
+                reasons = (SELECT group_concat(value, char(10)) FROM json_each(qualified_leads.reasons)),
+                next_steps = (SELECT group_concat(value, char(10)) FROM json_each(qualified_leads.next_steps))
+            WHERE json_valid(reasons) AND json_valid(next_steps)
+        ''')
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_leads_score ON qualified_leads (score)")
+
+    created = not table_exists(cursor, 'lead_stats')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lead_stats (
+            state TEXT NOT NULL,
+            priority TEXT NOT NULL,
+            leads INTEGER NOT NULL DEFAULT 0,
+            score_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (state, priority)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_lead_stats_insert
+        AFTER INSERT ON qualified_leads
+        BEGIN
+            INSERT INTO lead_stats (state, priority, leads, score_sum)
+            VALUES (IFNULL(NEW.state, ''), IFNULL(NEW.priority, ''), 1, IFNULL(NEW.score, 0))
+            ON CONFLICT (state, priority) DO UPDATE SET
+                leads = leads + 1,
+                score_sum = score_sum + excluded.score_sum;
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_lead_stats_delete
+        AFTER DELETE ON qualified_leads
+        BEGIN
+            UPDATE lead_stats SET
+                leads = leads - 1,
+                score_sum = score_sum - IFNULL(OLD.score, 0)
+            WHERE state = IFNULL(OLD.state, '') AND priority = IFNULL(OLD.priority, '');
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_lead_stats_update
+        AFTER UPDATE OF state, priority, score ON qualified_leads
+        BEGIN
+            UPDATE lead_stats SET
+                leads = leads - 1,
+                score_sum = score_sum - IFNULL(OLD.score, 0)
+            WHERE state = IFNULL(OLD.state, '') AND priority = IFNULL(OLD.priority, '');
+            INSERT INTO lead_stats (state, priority, leads, score_sum)
+            VALUES (IFNULL(NEW.state, ''), IFNULL(NEW.priority, ''), 1, IFNULL(NEW.score, 0))
+            ON CONFLICT (state, priority) DO UPDATE SET
+                leads = leads + 1,
+                score_sum = score_sum + excluded.score_sum;
+        END
+    ''')
+
+    if created:
+        cursor.execute('''
+            INSERT INTO lead_stats (state, priority, leads, score_sum)
+            SELECT IFNULL(state, ''), IFNULL(priority, ''), COUNT(*), IFNULL(SUM(score), 0)
+            FROM qualified_leads GROUP BY IFNULL(state, ''), IFNULL(priority, '')
+        ''')
+
+    # One lead per contact (the newest), so saves can upsert on contact_id
+    if not index_exists(cursor, 'idx_leads_contact_id'):
+        cursor.execute('''
+            DELETE FROM qualified_leads
+            WHERE id NOT IN (SELECT MAX(id) FROM qualified_leads GROUP BY contact_id)
+        ''')
+        cursor.execute("DROP INDEX IF EXISTS idx_leads_contact")
+        cursor.execute("CREATE UNIQUE INDEX idx_leads_contact_id ON qualified_leads (contact_id)")
+
+    migrate_score_history(cursor)
+
+
+def migrate_score_history(cursor: sqlite3.Cursor):
+    """Create the append-only lead_score_history table and the triggers filling it
+
+    A row is added when a lead is first scored and whenever its score or
+    priority changes.
+    """
+    created = not table_exists(cursor, 'lead_score_history')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lead_score_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contact_id INTEGER NOT NULL,
+            score REAL,
+            priority TEXT,
+            scored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_score_history_contact
+        ON lead_score_history (contact_id, scored_at)
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_score_history_insert
+        AFTER INSERT ON qualified_leads
+        BEGIN
+            INSERT INTO lead_score_history (contact_id, score, priority)
+            VALUES (NEW.contact_id, NEW.score, NEW.priority);
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_score_history_update
+        AFTER UPDATE OF score, priority ON qualified_leads
+        WHEN OLD.score IS NOT NEW.score OR OLD.priority IS NOT NEW.priority
+        BEGIN
+            INSERT INTO lead_score_history (contact_id, score, priority)
+            VALUES (NEW.contact_id, NEW.score, NEW.priority);
+        END
+    ''')
+
+    if created:
+        cursor.execute('''
+            INSERT INTO lead_score_history (contact_id, score, priority, scored_at)
+            SELECT contact_id, score, priority, IFNULL(updated_at, created_at) FROM qualified_leads
+        ''')
@@ -0,0 +1,117 @@
+"""
+Shared test fixtures: the scripts directory on sys.path, a loader for the
+hyphenated entry-point scripts, and stand-in HTTP servers on localhost
+"""
+
+import importlib.util
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+def load_script(filename: str):
+    """Import a script such as government-contact-scraper.py as a module"""
+    name = filename[:-3].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPTS_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class StandInServer:
+    """Threaded localhost server answering GETs from a route table
+
+    routes maps a path to an HTML string, or to a callable taking the
+    parsed query and returning (content type, body). Every request sleeps
+    latency seconds before answering and is recorded as (path, start, end)
+    on the monotonic clock.
+    """
+
+    def __init__(self, routes, latency: float = 0.0):
+        self.routes = routes
+        self.latency = latency
+        self.requests = []
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self.handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                started = time.monotonic()
+                parts = urlsplit(self.path)
+                route = server.routes.get(parts.path)
+                time.sleep(server.latency)
+                if route is None:
+                    status, content_type, body = 404, 'text/plain', 'not found'
+                elif callable(route):
+                    status = 200
+                    content_type, body = route(parse_qs(parts.query))
+                else:
+                    status, content_type, body = 200, 'text/html; charset=utf-8', route
+                payload = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                with server._lock:
+                    server.requests.append((parts.path, started, time.monotonic()))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def starts(self):
+        """Request start times in order"""
+        with self._lock:
+            return sorted(start for _, start, _ in self.requests)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def peak_overlap(servers) -> int:
+    """Most requests in progress at once across the given servers"""
+    events = []
+    for server in servers:
+        for _, start, end in server.requests:
+            events.extend([(start, 1), (end, -1)])
+    peak = current = 0
+    for _, step in sorted(events, key=lambda event: (event[0], event[1])):
+        current += step
+        peak = max(peak, current)
+    return peak
+
+
+@pytest.fixture
+def stand_in():
+    """Factory for stand-in servers, all shut down after the test"""
+    servers = []
+
+    def start(routes, latency: float = 0.0) -> StandInServer:
+        server = StandInServer(routes, latency)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
@@ -0,0 +1,67 @@
+"""Contact enrichment against a stand-in search API and town websites"""
+
+import json
+import sqlite3
+
+from conftest import load_script, peak_overlap
+
+scraper_module = load_script('government-contact-scraper.py')
+enrichment_module = load_script('contact-enrichment.py')
+
+HOST_DELAY = 0.5
+SEARCH_SPACING = 1.0
+SITE_LATENCY = 0.8
+TOLERANCE = 0.05
+TOWNS = ('Abbeville', 'Brantley', 'Clio')
+
+
+def town_site(town):
+    slug = town.lower()
+    return {
+        f'/{slug}.gov/': '<html><body><a href="contact">Contact Us</a></body></html>',
+        f'/{slug}.gov/contact': (
+            f'<html><body><p>Town Clerk: clerk@{slug}.gov</p><p>Phone: (334) 555-0100</p></body></html>'
+        ),
+    }
+
+
+def test_search_discovery_keeps_host_spacing_across_towns(tmp_path, stand_in):
+    sites = {town: stand_in(town_site(town), latency=SITE_LATENCY) for town in TOWNS}
+
+    def search(query):
+        town = query['q'][0].split()[0]
+        results = [{'FirstURL': f'{sites[town].url}/{town.lower()}.gov/'}] if town in sites else []
+        return 'application/json', json.dumps({'Results': results})
+
+    search_api = stand_in({'/': search})
+
+    db_path = str(tmp_path / 'contacts.db')
+    scraper = scraper_module.GovernmentContactScraper(db_path, http_cache_path=None, parse_workers=0)
+    scraper.save_contacts([
+        scraper_module.GovernmentContact(municipality=town, state='Alabama', population=2000)
+        for town in TOWNS
+    ])
+
+    enricher = enrichment_module.ContactEnricher(
+        db_path, http_cache_path=None, parse_workers=0, host_delay=HOST_DELAY,
+        search_url=f'{search_api.url}/', discovery='search'
+    )
+    enricher.enrich_contacts(limit=10, concurrency=3)
+
+    conn = sqlite3.connect(db_path)
+    rows = dict(conn.execute("SELECT municipality, email FROM government_contacts").fetchall())
+    conn.close()
+    assert rows == {town: f'clerk@{town.lower()}.gov' for town in TOWNS}
+
+    # One search per town, never closer than the search API's spacing
+    search_starts = search_api.starts()
+    assert len(search_starts) == len(TOWNS)
+    assert all(later - earlier >= SEARCH_SPACING - TOLERANCE
+               for earlier, later in zip(search_starts, search_starts[1:]))
+
+    # Each town site keeps the host delay, while different towns overlap
+    for site in sites.values():
+        starts = site.starts()
+        assert len(starts) == 2
+        assert starts[1] - starts[0] >= HOST_DELAY - TOLERANCE
+    assert peak_overlap(sites.values()) > 1
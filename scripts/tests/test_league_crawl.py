@@ -0,0 +1,55 @@
+"""League directory crawl against two stand-in league hosts"""
+
+from conftest import load_script, peak_overlap
+
+scraper_module = load_script('government-contact-scraper.py')
+
+HOST_DELAY = 0.6
+LATENCY = 0.2
+# Server-side start times trail the client's slot by connection setup
+TOLERANCE = 0.05
+
+
+def directory_page(towns):
+    entries = ''.join(
+        f'<div class="municipality"><h3>{town}</h3><span class="contact-name">Clerk of {town}</span></div>'
+        for town in towns
+    )
+    return f'<html><body>{entries}</body></html>'
+
+
+def test_hosts_crawled_in_parallel_with_per_host_delay(tmp_path, stand_in):
+    pages = {
+        f'/members/{page}': directory_page([f'Town {page}{letter}' for letter in 'abc'])
+        for page in range(3)
+    }
+    first = stand_in(pages, latency=LATENCY)
+    second = stand_in(pages, latency=LATENCY)
+
+    sources = {}
+    for index, server in enumerate((first, second)):
+        for page in range(3):
+            sources[f'State {index}-{page}'] = f'{server.url}/members/{page}'
+
+    scraper = scraper_module.GovernmentContactScraper(
+        str(tmp_path / 'contacts.db'), league_sources=sources, host_delay=HOST_DELAY,
+        http_cache_path=None, parse_workers=0
+    )
+    contacts = scraper.scrape_state_municipal_leagues(max_workers=4)
+
+    assert len(contacts) == 18
+    assert {contact.contact_name for contact in contacts} >= {'Clerk of Town 0a', 'Clerk of Town 2c'}
+
+    # The two hosts are fetched at the same time...
+    assert peak_overlap([first, second]) == 2
+    assert abs(first.starts()[0] - second.starts()[0]) < HOST_DELAY / 2
+
+    # ...while each host's own requests keep the delay: the full delay
+    # before any latency is known, never less than min_delay after that
+    min_delay = scraper.hosts.min_delay
+    for server in (first, second):
+        starts = server.starts()
+        assert len(starts) == 3
+        gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+        assert gaps[0] >= HOST_DELAY - TOLERANCE
+        assert all(gap >= min_delay - TOLERANCE for gap in gaps)
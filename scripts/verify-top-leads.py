@@ -6,9 +6,12 @@ Verifies contact information for your highest priority prospects
 
 import requests
 import csv
-import time
 from urllib.parse import urlparse
 
+from http_cache import install_cache
+from host_throttle import HostController
+from bounded_fetch import fetch_page
+
 def verify_top_leads():
     """Verify the top leads from our sample"""
     
@@ -53,6 +56,11 @@ def verify_top_leads():
     
     verified_leads = []
     
+    # Share cached homepages with the scraper, enricher and qualifier
+    session = requests.Session()
+    install_cache(session)
+    hosts = HostController()  # Be respectful
+    
     print("🔍 Verifying Top 5 Government Prospects")
     print("=" * 45)
     
@@ -63,7 +71,10 @@ def verify_top_leads():
         working_website = None
         for website in [prospect['likely_website']] + prospect['alt_websites']:
             try:
-                response = requests.get(website, timeout=10, allow_redirects=True)
+                with hosts.request(website, timeout=10) as slot:
+                    # Only the status matters, so the body stops after the first 16 KB
+                    response = fetch_page(session, website, timeout=slot.timeout, prefix_bytes=16 * 1024)
+                    slot.record(response)
                 if response.status_code == 200:
                     working_website = website
                     print(f"  ✅ Website found: {website}")
@@ -72,8 +83,6 @@ def verify_top_leads():
                     print(f"  ❌ {website} - Status: {response.status_code}")
             except Exception as e:
                 print(f"  ❌ {website} - Error: Connection failed")
-            
-            time.sleep(2)  # Be respectful
         
         if not working_website:
             print(f"  🔍 Manual research needed for {prospect['name']}")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Website Snapshots
+Versioned website analyses keyed by a content hash and a 64-bit simhash of
+the page, so re-qualification only re-analyzes sites whose content has
+changed, and redesigns show up as large simhash jumps between snapshots.
+Sites settled by the pre-screen keep partial snapshots of the page prefix
+that was read, so an unchanged vendor customer is not fingerprinted again.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from http_cache import normalize_url
+
+SIMHASH_BITS = 64
+UNCHANGED_BITS = 3  # Simhash distance still treated as the same page (rotating tokens, dates)
+REDESIGN_BITS = 16  # Simhash distance reported as a redesign
+
+PAGE_TOKEN = re.compile(r'[a-z0-9]{2,}')
+
+# Simhash bit counters are kept side by side in one big integer, LANE bits
+# each; SPREAD[k][byte] places the bits of a hash's k-th byte in their lanes
+LANE = 32
+LANE_MASK = (1 << LANE) - 1
+SPREAD = [
+    [sum((byte >> j & 1) << ((8 * k + j) * LANE) for j in range(8)) for byte in range(256)]
+    for k in range(SIMHASH_BITS // 8)
+]
+
+
+def simhash(tokens: Counter) -> int:
+    """64-bit simhash of weighted tokens; similar pages differ in few bits
+
+    Bit i is set when the tokens whose hash has bit i set carry more than
+    half of the total weight.
+    """
+    lanes = 0
+    total = 0
+    for token, weight in tokens.items():
+        digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+        lanes += weight * sum(table[byte] for table, byte in zip(SPREAD, digest))
+        total += weight
+    return sum(
+        1 << bit for bit in range(SIMHASH_BITS) if 2 * (lanes >> (bit * LANE) & LANE_MASK) > total
+    )
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def page_fingerprint(html: bytes, encoding: Optional[str] = None) -> Tuple[str, int]:
+    """Pool worker: (sha256 of the body, simhash of its markup and text tokens)"""
+    text = html.decode(encoding or 'utf-8', errors='replace').lower()
+    return hashlib.sha256(html).hexdigest(), simhash(Counter(PAGE_TOKEN.findall(text)))
+
+
+def to_signed(value: int) -> int:
+    """Store an unsigned 64-bit simhash in an SQLite INTEGER"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class SnapshotStore:
+    """website_snapshots table: one row per distinct version of each site
+
+    A fetch that finds the page unchanged only updates checked_at on the
+    latest snapshot; a changed page adds a row with its simhash distance
+    from the previous one. Partial snapshots (of a page prefix) and full
+    ones are only compared with snapshots of the same kind.
+    """
+
+    def __init__(self, db_path: str = "government_contacts.db", max_age: float = 90 * 24 * 3600):
+        self.db_path = db_path
+        self.max_age = max_age  # Unchanged sites are still re-analyzed after this long
+        self.init_database()
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def init_database(self):
+        conn = self.connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS website_snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                website TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                simhash INTEGER NOT NULL,
+                distance INTEGER,
+                cms TEXT,
+                analysis TEXT NOT NULL,
+                taken_at REAL NOT NULL,
+                checked_at REAL NOT NULL,
+                partial INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        if 'partial' not in {row[1] for row in conn.execute("PRAGMA table_info(website_snapshots)")}:
+            conn.execute("ALTER TABLE website_snapshots ADD COLUMN partial INTEGER NOT NULL DEFAULT 0")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_snapshots_website ON website_snapshots (website, taken_at)"
+        )
+        conn.commit()
+        conn.close()
+
+    def latest(self, website: str, partial: bool = False) -> Optional[Dict]:
+        """The most recent full (or partial) snapshot of a site, or None"""
+        conn = self.connect()
+        row = conn.execute('''
+            SELECT id, content_hash, simhash, analysis, taken_at, checked_at FROM website_snapshots
+            WHERE website = ? AND partial = ? ORDER BY taken_at DESC LIMIT 1
+        ''', (normalize_url(website), int(partial))).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        snapshot_id, content_hash, simhash_value, analysis, taken_at, checked_at = row
+        return {
+            'id': snapshot_id,
+            'content_hash': content_hash,
+            'simhash': simhash_value & ((1 << 64) - 1),
+            'analysis': json.loads(analysis),
+            'taken_at': taken_at,
+            'checked_at': checked_at,
+        }
+
+    def unchanged(self, snapshot: Optional[Dict], content_hash: str, simhash_value: int) -> bool:
+        """Whether a fetched page matches a snapshot recent enough to reuse"""
+        if snapshot is None or time.time() - snapshot['taken_at'] > self.max_age:
+            return False
+        return (snapshot['content_hash'] == content_hash
+                or hamming(snapshot['simhash'], simhash_value) <= UNCHANGED_BITS)
+
+    def touch(self, snapshot_id: int):
+        conn = self.connect()
+        conn.execute("UPDATE website_snapshots SET checked_at = ? WHERE id = ?", (time.time(), snapshot_id))
+        conn.commit()
+        conn.close()
+
+    def record(self, website: str, content_hash: str, simhash_value: int, analysis: Dict,
+               previous: Optional[Dict] = None, partial: bool = False) -> Optional[int]:
+        """Add a snapshot; returns its simhash distance from previous (None for a first snapshot)
+
+        previous must be the latest snapshot of the same kind (full or partial).
+        """
+        distance = hamming(previous['simhash'], simhash_value) if previous else None
+        now = time.time()
+        conn = self.connect()
+        conn.execute('''
+            INSERT INTO website_snapshots
+            (website, content_hash, simhash, distance, cms, analysis, taken_at, checked_at, partial)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            normalize_url(website), content_hash, to_signed(simhash_value), distance,
+            analysis.get('cms'), json.dumps(analysis), now, now, int(partial)
+        ))
+        conn.commit()
+        conn.close()
+        return distance
+
+    def redesigned(self, since: float, min_distance: int = REDESIGN_BITS) -> List[Dict]:
+        """Sites whose snapshot since a time jumped by min_distance bits or changed CMS
+
+        CMS changes are found across full and partial snapshots alike, so a
+        vendor customer moving off its platform shows up too.
+        """
+        conn = self.connect()
+        rows = conn.execute('''
+            SELECT website, taken_at, distance, previous_cms, cms FROM (
+                SELECT website, taken_at, distance, cms,
+                       LAG(cms) OVER (PARTITION BY website ORDER BY taken_at) AS previous_cms,
+                       LAG(id) OVER (PARTITION BY website ORDER BY taken_at) AS previous_id
+                FROM website_snapshots
+            )
+            WHERE taken_at >= ? AND previous_id IS NOT NULL AND (distance >= ? OR cms IS NOT previous_cms)
+            ORDER BY taken_at DESC
+        ''', (since, min_distance)).fetchall()
+        conn.close()
+        return [
+            {'website': website, 'taken_at': taken_at, 'distance': distance,
+             'previous_cms': previous_cms, 'cms': cms}
+            for website, taken_at, distance, previous_cms, cms in rows
+        ]
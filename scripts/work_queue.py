@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Shared Work Queue
+Leased tasks for enrichment and qualification, so several worker processes
+(on one host, or several hosts sharing the database) can drain the same
+stage without processing a municipality twice.
+
+WorkQueue is the backend interface and its SQLite implementation; another
+store only needs the same enqueue/lease/heartbeat/complete/fail methods.
+A leased task becomes visible again once its lease expires without a
+heartbeat, so work held by a crashed worker is reclaimed automatically.
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pipeline_checkpoints import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+class WorkQueue:
+    """Named queues of leased tasks stored in the pipeline database
+
+    Task status is 'pending', 'leased', 'done' or 'dead'. A failed task is
+    retried after retry_delay * 2^(attempts - 1) seconds until it has been
+    attempted max_attempts times, then it is dead.
+    """
+
+    def __init__(self, db_path: str = "government_contacts.db", worker_id: Optional[str] = None,
+                 lease_seconds: float = 300, max_attempts: int = 3, retry_delay: float = 60):
+        self.db_path = db_path
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.init_database()
+
+    def connect(self) -> sqlite3.Connection:
+        # Autocommit mode so lease() can take the write lock up front
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def init_database(self):
+        conn = self.connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS work_queue (
+                queue TEXT NOT NULL,
+                item TEXT NOT NULL,
+                payload TEXT,
+                priority REAL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                last_error TEXT,
+                result TEXT,
+                updated_at REAL,
+                PRIMARY KEY (queue, item)
+            )
+        ''')
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_work_queue_status ON work_queue (queue, status, priority DESC)"
+        )
+        conn.close()
+
+    def enqueue(self, queue: str, tasks: Iterable[Tuple[object, Dict, float]],
+                reopen_before: float = 0) -> int:
+        """Add (item, payload, priority) tasks
+
+        An item already queued is left alone, unless it is done or dead and
+        last changed before reopen_before, in which case it is pending again
+        with fresh attempts. Pending and leased tasks are never touched.
+        Returns the number of tasks added or reopened.
+        """
+        conn = self.connect()
+        conn.execute("BEGIN")
+        cursor = conn.executemany('''
+            INSERT INTO work_queue (queue, item, payload, priority, max_attempts, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (queue, item) DO UPDATE SET
+                payload = excluded.payload, priority = excluded.priority, status = 'pending',
+                attempts = 0, max_attempts = excluded.max_attempts, available_at = 0,
+                last_error = NULL, result = NULL, updated_at = excluded.updated_at
+            WHERE status IN ('done', 'dead') AND updated_at < ?
+        ''', (
+            (queue, str(item), json.dumps(payload), priority, self.max_attempts, time.time(), reopen_before)
+            for item, payload, priority in tasks
+        ))
+        added = cursor.rowcount
+        conn.execute("COMMIT")
+        conn.close()
+        return added
+
+    def lease(self, queue: str, count: int) -> List[Tuple[str, Dict]]:
+        """Lease up to count available tasks (highest priority first) to this worker
+
+        Available means pending and due, or leased with an expired lease.
+        Expired leases that have used up their attempts are marked dead.
+        """
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute('''
+                UPDATE work_queue SET status = 'dead', lease_owner = NULL,
+                    last_error = COALESCE(last_error, 'lease expired'), updated_at = ?
+                WHERE queue = ? AND status = 'leased' AND lease_expires < ? AND attempts >= max_attempts
+            ''', (now, queue, now))
+            rows = conn.execute('''
+                SELECT item, payload FROM work_queue
+                WHERE queue = ? AND (
+                    (status = 'pending' AND available_at <= ?) OR (status = 'leased' AND lease_expires < ?)
+                )
+                ORDER BY priority DESC, rowid
+                LIMIT ?
+            ''', (queue, now, now, count)).fetchall()
+            conn.executemany('''
+                UPDATE work_queue SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE queue = ? AND item = ?
+            ''', [(self.worker_id, now + self.lease_seconds, now, queue, item) for item, _ in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return [(item, json.loads(payload) if payload else {}) for item, payload in rows]
+
+    def heartbeat(self, queue: str, items: Iterable[str]) -> int:
+        """Extend this worker's leases on items; returns how many are still held"""
+        now = time.time()
+        conn = self.connect()
+        before = conn.total_changes
+        conn.executemany('''
+            UPDATE work_queue SET lease_expires = ?, updated_at = ?
+            WHERE queue = ? AND item = ? AND status = 'leased' AND lease_owner = ?
+        ''', [(now + self.lease_seconds, now, queue, str(item), self.worker_id) for item in items])
+        held = conn.total_changes - before
+        conn.close()
+        return held
+
+    def complete(self, queue: str, item, result=None) -> bool:
+        """Mark a task done; False if the lease was lost to another worker"""
+        conn = self.connect()
+        cursor = conn.execute('''
+            UPDATE work_queue SET status = 'done', result = ?, last_error = NULL,
+                lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE queue = ? AND item = ? AND status = 'leased' AND lease_owner = ?
+        ''', (json.dumps(result) if result is not None else None, time.time(), queue, str(item), self.worker_id))
+        conn.close()
+        return cursor.rowcount > 0
+
+    def fail(self, queue: str, item, error: str) -> Optional[str]:
+        """Record a failed attempt; returns the new status ('pending' or 'dead')"""
+        now = time.time()
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute('''
+            SELECT attempts, max_attempts FROM work_queue
+            WHERE queue = ? AND item = ? AND status = 'leased' AND lease_owner = ?
+        ''', (queue, str(item), self.worker_id)).fetchone()
+        status = None
+        if row:
+            attempts, max_attempts = row
+            status = 'dead' if attempts >= max_attempts else 'pending'
+            conn.execute('''
+                UPDATE work_queue SET status = ?, last_error = ?, available_at = ?,
+                    lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE queue = ? AND item = ?
+            ''', (status, error, now + self.retry_delay * 2 ** (attempts - 1), now, queue, str(item)))
+        conn.execute("COMMIT")
+        conn.close()
+        return status
+
+    def results(self, queue: str, since: float = 0) -> Dict[str, object]:
+        """Stored results of tasks completed at or after since (default: all)"""
+        conn = self.connect()
+        rows = conn.execute('''
+            SELECT item, result FROM work_queue
+            WHERE queue = ? AND status = 'done' AND result IS NOT NULL AND updated_at >= ?
+        ''', (queue, since)).fetchall()
+        conn.close()
+        return {item: json.loads(result) for item, result in rows}
+
+    def counts(self, queue: str) -> Dict[str, int]:
+        """Task counts by status"""
+        conn = self.connect()
+        rows = conn.execute(
+            "SELECT status, COUNT(*) FROM work_queue WHERE queue = ? GROUP BY status", (queue,)
+        ).fetchall()
+        conn.close()
+        return dict(rows)
+
+    def next_available(self, queue: str) -> Optional[float]:
+        """When the next task could be leased: the earliest due time of a pending
+        task or lease expiry of a leased one; None when neither is left
+        """
+        conn = self.connect()
+        row = conn.execute('''
+            SELECT MIN(CASE status WHEN 'pending' THEN available_at ELSE lease_expires END)
+            FROM work_queue WHERE queue = ? AND status IN ('pending', 'leased')
+        ''', (queue,)).fetchone()
+        conn.close()
+        return row[0]
+
+    def reset(self, queue: str) -> int:
+        """Drop every task of a queue that is not leased; returns how many
+
+        Leased tasks are kept, expired leases included, so work in flight
+        on other workers is neither lost nor queued a second time.
+        """
+        conn = self.connect()
+        cursor = conn.execute("DELETE FROM work_queue WHERE queue = ? AND status != 'leased'", (queue,))
+        conn.close()
+        return cursor.rowcount
+
+
+class LeaseHeartbeat:
+    """Background thread renewing the leases of the tasks a worker holds"""
+
+    def __init__(self, work_queue: WorkQueue, queue: str):
+        self.work_queue = work_queue
+        self.queue = queue
+        self.items = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def track(self, item: str):
+        with self._lock:
+            self.items.add(item)
+
+    def untrack(self, item: str):
+        with self._lock:
+            self.items.discard(item)
+
+    def run(self):
+        while not self._stop.wait(self.work_queue.lease_seconds / 3):
+            with self._lock:
+                items = list(self.items)
+            if items:
+                try:
+                    self.work_queue.heartbeat(self.queue, items)
+                except sqlite3.Error as e:
+                    logger.warning(f"Lease heartbeat failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def drain(work_queue: WorkQueue, queue: str, handler: Callable[[str, Dict], object],
+          concurrency: int = 4, deadline: Optional[Deadline] = None,
+          poll_interval: float = 5.0) -> Dict[str, int]:
+    """Lease and run tasks until the queue has no pending or leased tasks or the deadline passes
+
+    handler(item, payload) runs in a thread pool; its return value is stored
+    as the task result and an exception counts as a failed attempt. While
+    the only tasks left are failures waiting out their backoff or leased by
+    other workers, the drain sleeps (polling every poll_interval seconds)
+    and then leases again, so retries and expired leases are picked up in
+    the same run. Returns this worker's counts of done, failed and lost tasks.
+    """
+    deadline = deadline or Deadline()
+    concurrency = max(concurrency, 1)
+    counts = {'done': 0, 'failed': 0, 'lost': 0}
+
+    with LeaseHeartbeat(work_queue, queue) as heartbeat, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = {}
+        while True:
+            if not deadline.expired() and len(in_flight) < concurrency:
+                for item, payload in work_queue.lease(queue, concurrency - len(in_flight)):
+                    heartbeat.track(item)
+                    in_flight[executor.submit(handler, item, payload)] = item
+
+            if not in_flight:
+                next_available = None if deadline.expired() else work_queue.next_available(queue)
+                if next_available is None:
+                    break
+                pause = min(max(next_available - time.time(), 0.05), poll_interval)
+                remaining = deadline.remaining()
+                time.sleep(pause if remaining is None else max(min(pause, remaining), 0))
+                continue
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                item = in_flight.pop(future)
+                heartbeat.untrack(item)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"{queue} task {item} failed: {e}")
+                    work_queue.fail(queue, item, str(e))
+                    counts['failed'] += 1
+                    continue
+                if work_queue.complete(queue, item, result):
+                    counts['done'] += 1
+                else:
+                    # The lease expired and another worker took the task over
+                    counts['lost'] += 1
+
+    return counts